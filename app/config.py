@@ -7,6 +7,74 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     MAX_FILE_SIZE: int = 10 * 1024 * 1024
     UPLOAD_DIR: str = "uploads"
+    EMBEDDING_MAX_BATCH: int = 64
+    EMBEDDING_MAX_WAIT_MS: float = 5.0
+    # One of "torch", "onnx" or "onnx-int8"; ONNX models are exported with
+    # scripts/export_onnx_embeddings.py
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_MODEL: str = "all-mpnet-base-v2"
+    # Defaults to models/<EMBEDDING_MODEL>-onnx
+    EMBEDDING_ONNX_DIR: str = ""
+    # 0 lets the runtime pick
+    EMBEDDING_THREADS: int = 0
+    # "chroma" or "compact" (quantized per-document files, see
+    # app/services/vector_backends.py)
+    VECTOR_STORAGE: str = "chroma"
+    COMPACT_VECTOR_DIR: str = "compact_vectors"
+    # "int8" or "float16"
+    COMPACT_VECTOR_DTYPE: str = "int8"
+    COMPACT_RERANK: bool = True
+    # Candidates re-ranked exactly, as a multiple of the requested results
+    COMPACT_RERANK_CANDIDATES: int = 4
+    LEXICAL_INDEX_DIR: str = "lexical_index"
+    # Per-document BM25 indexes kept in memory, per process
+    LEXICAL_INDEX_CACHE_SIZE: int = 256
+    # One of "vector", "lexical", "hybrid" or "auto"
+    RETRIEVAL_MODE: str = "auto"
+    HYBRID_VECTOR_WEIGHT: float = 0.6
+    LEXICAL_FAST_PATH_MAX_TERMS: int = 4
+    # 0 uses one worker process per CPU
+    INGEST_WORKERS: int = 0
+    # auto (fastest installed), pymupdf, pypdfium2 or pdfminer
+    PDF_BACKEND: str = "auto"
+    # Chunks buffered between text extraction and embedding on upload
+    INGEST_QUEUE_CHUNKS: int = 128
+    BATCH_ANALYSIS_CONCURRENCY: int = 4
+    # "first_chunk" analyzes only the opening chunk; "map_reduce" also
+    # summarizes every chunk in the background and reduces the summaries
+    # (dozens of calls for a large document, within the background share
+    # of the LLM budget, see LLM_INTERACTIVE_RESERVE)
+    ANALYSIS_MODE: str = "first_chunk"
+    ANALYSIS_CONCURRENCY: int = 4
+    # Summaries combined per reduce call
+    ANALYSIS_REDUCE_FANOUT: int = 8
+    ANALYSIS_SECTION_MAX_TOKENS: int = 256
+    # Excerpts in a cross-document prompt, in estimated tokens; the
+    # lowest ranked ones are dropped beyond it
+    LIBRARY_CONTEXT_TOKEN_BUDGET: int = 3000
+    # Conversation memory, in estimated tokens (~4 characters each)
+    CHAT_RECENT_TURNS: int = 3
+    CHAT_HISTORY_TOKEN_BUDGET: int = 1500
+    CHAT_SUMMARY_THRESHOLD_TOKENS: int = 800
+    CHAT_SUMMARY_MAX_TOKENS: int = 300
+    # LLM admission control, matching our Groq tier. Calls are estimated
+    # at prompt plus maximum completion (an /ask with history and overview
+    # is ~6000) and settled against the real usage afterwards.
+    GROQ_MAX_CONCURRENCY: int = 4
+    GROQ_TOKENS_PER_MINUTE: int = 7000
+    USER_TOKENS_PER_MINUTE: int = 6000
+    LLM_MAX_QUEUE_DEPTH: int = 50
+    LLM_MAX_QUEUE_WAIT: float = 20.0
+    # Share of the concurrency and tokens per minute background calls
+    # (analysis, summaries) may not use, kept free for questions
+    LLM_INTERACTIVE_RESERVE: float = 0.3
+    # Retention, in days; 0 keeps data forever. Documents expire once
+    # neither they nor their chats have been touched for that long.
+    DOCUMENT_RETENTION_DAYS: int = 0
+    CHAT_RETENTION_DAYS: int = 0
+    RETENTION_SWEEP_INTERVAL_MINUTES: int = 60
+    # Serialized GET responses kept in memory, per process
+    HTTP_CACHE_MAX_ENTRIES: int = 1024
 
     class Config:
         env_file = ".env"
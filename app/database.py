@@ -1,5 +1,5 @@
 # database.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from app.config import settings
@@ -21,3 +21,29 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def add_missing_columns(bind, metadata):
+    """Add nullable columns the models have but existing tables lack.
+
+    create_all only creates missing tables; this covers columns added to
+    existing ones since. Columns already present are left alone, so it is
+    safe to run on every start.
+    """
+    inspector = inspect(bind)
+    added = []
+    with bind.begin() as connection:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"]
+                        for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                connection.exec_driver_sql(
+                    f'ALTER TABLE {table.name} '
+                    f'ADD COLUMN {column.name} {column_type}')
+                added.append(f"{table.name}.{column.name}")
+    return added
@@ -1,27 +1,54 @@
 # main.py
-from fastapi import FastAPI, HTTPException, UploadFile, File, Depends
+import time
+
+# Startup report: how long importing this module (and its imports) took
+_import_started = time.perf_counter()
+
+from fastapi import (
+    BackgroundTasks, FastAPI, HTTPException, UploadFile, File, Depends
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from requests import Session
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+from app.config import settings
 from app.models.document import ChatHistory
+from app.services.conversation_memory import (
+    ConversationMemory, refresh_chat_summary
+)
+from app.services.document_analysis import (
+    DocumentAnalyzer, run_document_analysis, run_first_chunk_analysis
+)
 from app.services.document_service import DocumentService
+from app.services.embedding_dispatcher import get_embedding_dispatcher
+from app.services.http_cache import (
+    cached_json_response, chat_key, document_key, documents_key,
+    get_response_cache
+)
+from app.services.ingestion import DocumentIngestion
+from app.services.maintenance import retention_enabled, retention_sweeper
+from app.services.llm_scheduler import LLMOverloaded, get_llm_scheduler
+from app.services.single_flight import single_flight_stats
 from .auth.auth_handler import AuthHandler
-from .services.document_processor import DocumentProcessor
+from .services.document_processor import DocumentProcessor, shutdown_workers
 from .services.llm_service import LLMService
 from .auth.routes import router as auth_router
 from .models import user
-from .database import engine, get_db
+from .database import add_missing_columns, engine, get_db
+from .warmup import LazyComponent, is_ready, startup_report, warmup
 from fastapi import Request
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import asyncio
 import logging
 
 
 app = FastAPI()
 auth_handler = AuthHandler()
-document_processor = DocumentProcessor()
-llm_service = LLMService()
-user.Base.metadata.create_all(bind=engine)
+# Built by the warmup task after the server is up (or on first use)
+document_processor = LazyComponent("document_processor", DocumentProcessor)
+llm_service = LazyComponent("llm_service", LLMService)
 limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
 
@@ -39,6 +66,20 @@ app.add_middleware(
 )
 
 
+def create_tables():
+    user.Base.metadata.create_all(bind=engine)
+    added = add_missing_columns(engine, user.Base.metadata)
+    if added:
+        logger.info(f"Added columns: {', '.join(added)}")
+
+
+async def components_ready():
+    # Handlers use the lazy components directly; wait for them off the
+    # event loop so a request during warmup doesn't stall every other one
+    await document_processor.resolve()
+    await llm_service.resolve()
+
+
 @app.on_event("startup")
 async def startup_event():
     import os
@@ -55,6 +96,46 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Upload directory setup failed: {str(e)}", exc_info=True)
 
+    startup_report["app_import"] = {
+        "status": "ready",
+        "seconds": round(app.state.imported_at - _import_started, 3)
+    }
+    # The schema is needed by every endpoint (auth included) and takes
+    # milliseconds, so it is created before the app starts serving
+    tables_started = time.perf_counter()
+    create_tables()
+    startup_report["database"] = {
+        "status": "ready",
+        "seconds": round(time.perf_counter() - tables_started, 3)
+    }
+    # Heavy components load in the background so the port binds at once;
+    # /ready turns 200 when they are done
+    app.state.warmup = asyncio.create_task(warmup([
+        ("document_processor", document_processor.get),
+        ("nltk_data", lambda: document_processor.preprocess_text(
+            "warming up the documents")),
+        ("llm_service", llm_service.get),
+        ("embedding_model", lambda: get_embedding_dispatcher()
+         .model.embed_documents(["warming up"])),
+    ]))
+    if retention_enabled():
+        app.state.retention_sweeper = asyncio.create_task(
+            retention_sweeper(after=app.state.warmup))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_workers()
+
+
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloaded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 
 
@@ -63,13 +144,43 @@ class QuestionRequest(BaseModel):
     document_id: int
 
 
+class LibraryQuestionRequest(BaseModel):
+    question: str
+    document_ids: Optional[List[int]] = None
+    # Excerpts in the prompt; bounded so one request can't blow it up
+    n_results: int = Field(5, ge=1, le=20)
+
+
 @app.get("/")
 async def health_check():
     return {"status": "healthy"}
 
 
-@app.post("/upload")
+@app.get("/ready")
+async def readiness_check():
+    ready = is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "starting",
+            "components": startup_report
+        }
+    )
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "embeddings": get_embedding_dispatcher().stats,
+        "single_flight": single_flight_stats(),
+        "llm_scheduler": get_llm_scheduler().metrics(),
+        "http_cache": get_response_cache().stats
+    }
+
+
+@app.post("/upload", dependencies=[Depends(components_ready)])
 async def upload_document(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: user.User = Depends(auth_handler.get_current_user),
     db: Session = Depends(get_db)
@@ -81,32 +192,23 @@ async def upload_document(
 
         content = await file.read()
         logger.info(f"File read successful, content length: {len(content)}")
-
-        try:
-            chunks = document_processor.process_pdf(content)
-            logger.info(
-                f"PDF processing successful, chunks created: {len(chunks)}")
-        except Exception as e:
-            logger.error(f"PDF processing failed: {str(e)}", exc_info=True)
-            raise HTTPException(
-                status_code=500, detail=f"PDF processing failed: {str(e)}")
-
         await file.seek(0)
 
+        # PDF, DOCX or plain text, recognized by content
         try:
-            result = await llm_service.analyze_document(chunks)
-            logger.info("Document analysis completed")
-        except Exception as e:
-            logger.error(f"Document analysis failed: {str(e)}", exc_info=True)
-            raise HTTPException(
-                status_code=500, detail=f"Document analysis failed: {str(e)}")
-
+            file_format = document_processor.detect_format(content)
+            logger.info(f"Detected {file_format} document")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # Saved first, titled after the file, so chunks can be stored
+        # under its id while extraction is still running
+        document_service = DocumentService(db)
         try:
-            document_service = DocumentService(db)
             document = await document_service.save_document(
                 file,
                 current_user.id,
-                title=result["title"]
+                title=file.filename
             )
             logger.info(f"Document saved successfully with ID: {document.id}")
         except Exception as e:
@@ -114,46 +216,202 @@ async def upload_document(
             raise HTTPException(
                 status_code=500, detail=f"Document save failed: {str(e)}")
 
-        # Add chat history
-        try:
-            chat = ChatHistory(
-                document_id=document.id,
-                question="What is this document about?",
-                answer=result["analysis"]
-            )
-            db.add(chat)
-            db.commit()
-            logger.info("Chat history saved")
-        except Exception as e:
-            logger.error(f"Chat history save failed: {str(e)}", exc_info=True)
-            raise HTTPException(
-                status_code=500, detail=f"Chat history save failed: {str(e)}")
-
-        # Vector store
+        # Extraction, chunking, embedding and storage run as one pipeline;
+        # analysis starts as soon as the first chunks are out
+        ingestion = DocumentIngestion(
+            content,
+            f"user_{current_user.id}_{document.id}",
+            document_processor,
+            document_service.vector_store,
+            file_format=file_format
+        )
+        storing = asyncio.create_task(ingestion.run())
         try:
-            document_id = f"user_{current_user.id}_{document.id}"
-            document_service.vector_store.store_chunks(chunks, document_id)
-            logger.info("Vector storage completed")
-        except Exception as e:
-            logger.error(f"Vector storage failed: {str(e)}", exc_info=True)
-            raise HTTPException(
-                status_code=500, detail=f"Vector storage failed: {str(e)}")
+            try:
+                chunks = await ingestion.first_chunks()
+                if not chunks:
+                    raise ValueError("no text found")
+                logger.info("Document processing started producing chunks")
+            except Exception as e:
+                logger.error(
+                    f"Document processing failed: {str(e)}", exc_info=True)
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Document processing failed: {str(e)}")
+
+            try:
+                result = await llm_service.analyze_document(
+                    chunks, user_id=current_user.id)
+                logger.info("Document analysis completed")
+            except LLMOverloaded:
+                raise
+            except Exception as e:
+                logger.error(
+                    f"Document analysis failed: {str(e)}", exc_info=True)
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Document analysis failed: {str(e)}")
+
+            try:
+                await storing
+                logger.info(
+                    f"Vector storage completed, chunks: {ingestion.chunks}")
+            except Exception as e:
+                logger.error(f"Vector storage failed: {str(e)}", exc_info=True)
+                raise HTTPException(
+                    status_code=500, detail=f"Vector storage failed: {str(e)}")
+
+            # Title and first chat entry
+            try:
+                document.title = result["title"]
+                chat = ChatHistory(
+                    document_id=document.id,
+                    question="What is this document about?",
+                    answer=result["analysis"]
+                )
+                db.add(chat)
+                db.commit()
+                logger.info("Chat history saved")
+            except Exception as e:
+                db.rollback()
+                logger.error(
+                    f"Chat history save failed: {str(e)}", exc_info=True)
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Chat history save failed: {str(e)}")
+        except BaseException:
+            # Don't leave a half-ingested document behind
+            storing.cancel()
+            await asyncio.gather(storing, return_exceptions=True)
+            db.rollback()
+            await document_service.delete_document_async(document)
+            raise
+
+        # The response carries the quick first-chunk analysis; the
+        # whole-document one replaces it when done
+        if settings.ANALYSIS_MODE == "map_reduce":
+            background_tasks.add_task(
+                run_document_analysis, document.id, llm_service)
 
         return {
             "document_id": document.id,
             "title": result["title"],
             "analysis": result["analysis"]
         }
-    except HTTPException:
+    except (HTTPException, LLMOverloaded):
         raise
     except Exception as e:
         logger.error(f"Unexpected error in upload: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
-@app.post("/ask")
+@app.post("/upload/batch", dependencies=[Depends(components_ready)])
+async def upload_documents(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    current_user: user.User = Depends(auth_handler.get_current_user),
+    db: Session = Depends(get_db)
+):
+    logger.info(f"Starting batch upload of {len(files)} files")
+    statuses = [{"filename": file.filename} for file in files]
+
+    def fail(index: int, stage: str, error: Exception):
+        logger.error(
+            f"{stage} failed for {files[index].filename}: {str(error)}")
+        statuses[index].update(
+            status="error", detail=f"{stage} failed: {str(error)}")
+
+    # Extract and chunk every file in parallel worker processes
+    contents = [await file.read() for file in files]
+    extracted = await document_processor.process_many(contents)
+    chunks_by_file = {}
+    for index, chunks in enumerate(extracted):
+        if isinstance(chunks, Exception):
+            fail(index, "Document processing", chunks)
+        else:
+            chunks_by_file[index] = chunks
+    logger.info(
+        f"Document processing completed for {len(chunks_by_file)} files")
+
+    # Analyze documents concurrently, capped to stay within the LLM quota
+    semaphore = asyncio.Semaphore(settings.BATCH_ANALYSIS_CONCURRENCY)
+
+    async def analyze(chunks):
+        async with semaphore:
+            return await llm_service.analyze_document(
+                chunks, user_id=current_user.id)
+
+    indexes = list(chunks_by_file)
+    analyses = await asyncio.gather(
+        *[analyze(chunks_by_file[index]) for index in indexes],
+        return_exceptions=True
+    )
+
+    document_service = DocumentService(db)
+    saved = {}
+    for index, result in zip(indexes, analyses):
+        if isinstance(result, Exception):
+            fail(index, "Document analysis", result)
+            continue
+        try:
+            await files[index].seek(0)
+            document = await document_service.save_document(
+                files[index],
+                current_user.id,
+                title=result["title"]
+            )
+            db.add(ChatHistory(
+                document_id=document.id,
+                question="What is this document about?",
+                answer=result["analysis"]
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            fail(index, "Document save", e)
+            continue
+
+        saved[index] = document
+        statuses[index].update(
+            status="ok",
+            document_id=document.id,
+            title=result["title"],
+            analysis=result["analysis"]
+        )
+
+    # Embed the chunks of all saved files in shared batches
+    try:
+        await document_service.vector_store.store_many([
+            (chunks_by_file[index], f"user_{current_user.id}_{document.id}")
+            for index, document in saved.items()
+        ])
+        logger.info("Vector storage completed")
+    except Exception as e:
+        # Don't leave documents behind that have no content to search
+        for index, document in saved.items():
+            fail(index, "Vector storage", e)
+            for key in ("document_id", "title", "analysis"):
+                statuses[index].pop(key, None)
+            try:
+                await document_service.delete_document_async(document)
+            except Exception as cleanup_error:
+                db.rollback()
+                logger.error(
+                    f"Cleanup of document {document.id} failed: "
+                    f"{str(cleanup_error)}", exc_info=True)
+    else:
+        if settings.ANALYSIS_MODE == "map_reduce":
+            for document in saved.values():
+                background_tasks.add_task(
+                    run_document_analysis, document.id, llm_service)
+
+    return statuses
+
+
+@app.post("/ask", dependencies=[Depends(components_ready)])
 async def ask_question(
     request: QuestionRequest,
+    background_tasks: BackgroundTasks,
     current_user: user.User = Depends(auth_handler.get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -167,10 +425,14 @@ async def ask_question(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    # Get answer using LLM
+    # Get answer using LLM, with the conversation so far
     answer = await llm_service.answer_question(
         request.question,
-        f"user_{current_user.id}_{request.document_id}"
+        f"user_{current_user.id}_{request.document_id}",
+        history=ConversationMemory(db).load(request.document_id),
+        user_id=current_user.id,
+        overview=DocumentAnalyzer(db, llm_service).overview(
+            request.document_id)
     )
 
     # Store chat history
@@ -182,6 +444,8 @@ async def ask_question(
     db.add(chat)
     db.commit()
     db.refresh(chat)
+    background_tasks.add_task(
+        refresh_chat_summary, request.document_id, llm_service)
 
     return {
         "id": chat.id,
@@ -189,37 +453,117 @@ async def ask_question(
         "answer": answer,
         "created_at": chat.created_at
     }
+
+
+@app.post("/documents/ask", dependencies=[Depends(components_ready)])
+async def ask_library(
+    request: LibraryQuestionRequest,
+    current_user: user.User = Depends(auth_handler.get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Restrict the search to the user's own documents
+    query = db.query(user.Document)\
+        .filter(user.Document.user_id == current_user.id)
+    if request.document_ids:
+        query = query.filter(user.Document.id.in_(request.document_ids))
+    documents = {
+        f"user_{current_user.id}_{doc.id}": doc
+        for doc in query.all()
+    }
+    if not documents:
+        raise HTTPException(status_code=404, detail="No documents found")
+
+    try:
+        result = await llm_service.answer_across_documents(
+            request.question,
+            {key: doc.title or doc.filename for key, doc in documents.items()},
+            n_results=request.n_results,
+            user_id=current_user.id
+        )
+    except LLMOverloaded:
+        raise
+    except Exception as e:
+        logger.error(f"Library question failed: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500, detail=f"Error processing question: {str(e)}")
+
+    return {
+        "question": request.question,
+        "answer": result["answer"],
+        "sources": [
+            {
+                "document_id": documents[source["document_id"]].id,
+                "title": documents[source["document_id"]].title,
+                "filename": documents[source["document_id"]].filename,
+                "score": source["score"]
+            }
+            for source in result["sources"]
+        ]
+    }
 # New endpoints in main.py
 
 
 @app.get("/documents/history")
 async def get_document_history(
+    request: Request,
     current_user: user.User = Depends(auth_handler.get_current_user),
     db: Session = Depends(get_db)
 ):
-    documents = db.query(user.Document)\
-        .filter(user.Document.user_id == current_user.id)\
-        .order_by(user.Document.created_at.desc())\
-        .all()
-
-    history = []
-    for doc in documents:
-        history.append({
-            "document_id": doc.id,
-            "filename": doc.filename,
-            "title": doc.title,
-            "created_at": doc.created_at,
-        })
-
-    return history
+    def build():
+        documents = db.query(user.Document)\
+            .filter(user.Document.user_id == current_user.id)\
+            .order_by(user.Document.created_at.desc())\
+            .all()
+
+        history = []
+        for doc in documents:
+            history.append({
+                "document_id": doc.id,
+                "filename": doc.filename,
+                "title": doc.title,
+                "created_at": doc.created_at,
+            })
+        return history
+
+    # 304 / cached body while none of the user's documents changed
+    return cached_json_response(
+        request, db, documents_key(current_user.id), build)
 
 
 @app.get("/documents/{document_id}")
 async def get_document(
+    request: Request,
+    document_id: int,
+    current_user: user.User = Depends(auth_handler.get_current_user),
+    db: Session = Depends(get_db)
+):
+    def build():
+        document = db.query(user.Document)\
+            .filter(
+                user.Document.id == document_id,
+                user.Document.user_id == current_user.id
+        )\
+            .first()
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+
+        return {
+            "id": document.id,
+            "filename": document.filename,
+            "created_at": document.created_at
+        }
+
+    return cached_json_response(
+        request, db, document_key(current_user.id, document_id), build)
+
+
+@app.delete("/documents/{document_id}")
+async def delete_document(
     document_id: int,
     current_user: user.User = Depends(auth_handler.get_current_user),
     db: Session = Depends(get_db)
 ):
+    # Verify document belongs to user
     document = db.query(user.Document)\
         .filter(
             user.Document.id == document_id,
@@ -229,17 +573,21 @@ async def get_document(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    return {
-        "id": document.id,
-        "filename": document.filename,
-        "created_at": document.created_at
-    }
+    try:
+        deleted = await DocumentService(db).delete_document_async(document)
+        logger.info(f"Deleted document {document_id}: {deleted}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Document delete failed: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500, detail=f"Document delete failed: {str(e)}")
 
+    return {"document_id": document_id, "deleted": deleted}
 
-@app.get("/documents/{document_id}/chat")
-@limiter.limit("5/minute")
-async def get_chat_history(
-    request: Request,  # Add this parameter
+
+@app.post("/documents/{document_id}/analyze",
+          dependencies=[Depends(components_ready)])
+async def analyze_document(
     document_id: int,
     current_user: user.User = Depends(auth_handler.get_current_user),
     db: Session = Depends(get_db)
@@ -249,32 +597,131 @@ async def get_chat_history(
         .filter(
             user.Document.id == document_id,
             user.Document.user_id == current_user.id
-    )\
-        .first()
+    ).first()
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    # Get chat history
-    chats = db.query(ChatHistory)\
-        .filter(ChatHistory.document_id == document_id)\
-        .order_by(ChatHistory.created_at.asc())\
-        .all()
-
-    return [
-        {
-            "id": chat.id,
-            "question": chat.question,
-            "answer": chat.answer,
-            "created_at": chat.created_at
-        }
-        for chat in chats
-    ]
+    # Map-reduce over every stored chunk; summaries of unchanged chunks
+    # are reused, so this is cheap after the first run
+    try:
+        result = await DocumentAnalyzer(db, llm_service).analyze(document)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except LLMOverloaded:
+        raise
+    except Exception as e:
+        logger.error(f"Document analysis failed: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500, detail=f"Document analysis failed: {str(e)}")
+
+    return {"document_id": document_id, **result}
 
 
-@app.post("/documents/{document_id}/chat")
+@app.put("/documents/{document_id}/file",
+         dependencies=[Depends(components_ready)])
+async def replace_document_file(
+    document_id: int,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    current_user: user.User = Depends(auth_handler.get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Verify document belongs to user
+    document = db.query(user.Document)\
+        .filter(
+            user.Document.id == document_id,
+            user.Document.user_id == current_user.id
+    ).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    content = await file.read()
+    try:
+        file_format = document_processor.detect_format(content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    document_service = DocumentService(db)
+    # Only chunks whose content changed are embedded again
+    ingestion = DocumentIngestion(
+        content,
+        f"user_{current_user.id}_{document_id}",
+        document_processor,
+        document_service.vector_store,
+        file_format=file_format
+    )
+    try:
+        document, stats = await document_service.replace_document_file(
+            document, file, content, ingestion.run)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Document ingestion failed: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500, detail=f"Document ingestion failed: {str(e)}")
+
+    # Title and analysis follow the new content; with map_reduce only
+    # sections that changed are summarized again
+    if settings.ANALYSIS_MODE == "map_reduce":
+        background_tasks.add_task(
+            run_document_analysis, document.id, llm_service)
+    else:
+        background_tasks.add_task(
+            run_first_chunk_analysis, document.id,
+            await ingestion.first_chunks(), llm_service)
+
+    return {
+        "document_id": document.id,
+        "filename": document.filename,
+        "chunks": stats
+    }
+
+
+@app.get("/documents/{document_id}/chat")
+@limiter.limit("5/minute")
+async def get_chat_history(
+    request: Request,  # Add this parameter
+    document_id: int,
+    current_user: user.User = Depends(auth_handler.get_current_user),
+    db: Session = Depends(get_db)
+):
+    def build():
+        # Verify document belongs to user
+        document = db.query(user.Document)\
+            .filter(
+                user.Document.id == document_id,
+                user.Document.user_id == current_user.id
+        )\
+            .first()
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+
+        # Get chat history
+        chats = db.query(ChatHistory)\
+            .filter(ChatHistory.document_id == document_id)\
+            .order_by(ChatHistory.created_at.asc())\
+            .all()
+
+        return [
+            {
+                "id": chat.id,
+                "question": chat.question,
+                "answer": chat.answer,
+                "created_at": chat.created_at
+            }
+            for chat in chats
+        ]
+
+    return cached_json_response(
+        request, db, chat_key(current_user.id, document_id), build)
+
+
+@app.post("/documents/{document_id}/chat",
+          dependencies=[Depends(components_ready)])
 async def add_chat(
     document_id: int,
     question: str,
+    background_tasks: BackgroundTasks,
     current_user: user.User = Depends(auth_handler.get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -290,7 +737,10 @@ async def add_chat(
     # Get answer using LLM
     answer = await llm_service.answer_question(
         question=question,
-        document_id=f"user_{current_user.id}_{document_id}"
+        document_id=f"user_{current_user.id}_{document_id}",
+        history=ConversationMemory(db).load(document_id),
+        user_id=current_user.id,
+        overview=DocumentAnalyzer(db, llm_service).overview(document_id)
     )
 
     # Store in chat history
@@ -302,6 +752,7 @@ async def add_chat(
     db.add(chat)
     db.commit()
     db.refresh(chat)
+    background_tasks.add_task(refresh_chat_summary, document_id, llm_service)
 
     return {
         "id": chat.id,
@@ -311,7 +762,8 @@ async def add_chat(
     }
 
 
-@app.get("/documents/{document_id}/suggested-prompts")
+@app.get("/documents/{document_id}/suggested-prompts",
+         dependencies=[Depends(components_ready)])
 async def get_suggested_prompts(
     document_id: int,
     current_user: user.User = Depends(auth_handler.get_current_user),
@@ -328,10 +780,15 @@ async def get_suggested_prompts(
 
     # Generate prompts using LLM
     prompts = await llm_service.generate_quick_prompts(
-        f"user_{current_user.id}_{document_id}"
+        f"user_{current_user.id}_{document_id}",
+        user_id=current_user.id,
+        overview=DocumentAnalyzer(db, llm_service).overview(document_id)
     )
 
     return {
         "document_id": document_id,
         "suggested_prompts": prompts
     }
+
+
+app.state.imported_at = time.perf_counter()
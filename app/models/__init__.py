@@ -1,5 +1,7 @@
 from .base import Base
 from .user import User, Document
-from .document import ChatHistory, DocumentAnalysis
+from .document import ChatHistory, ChatSummary, DocumentAnalysis
+from .cache import ResourceVersion
 
-__all__ = ['Base', 'User', 'Document', 'DocumentAnalysis', 'ChatHistory']
+__all__ = ['Base', 'User', 'Document', 'DocumentAnalysis', 'ChatHistory',
+           'ChatSummary', 'ResourceVersion']
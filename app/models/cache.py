@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, DateTime
+from datetime import datetime
+from .base import Base
+
+
+class ResourceVersion(Base):
+    __tablename__ = "resource_versions"
+
+    # e.g. "documents:{user_id}", "document:{user_id}:{document_id}"
+    key = Column(String, primary_key=True)
+    # Random per write, so concurrent writers never produce the same one
+    version = Column(String)
+    updated_at = Column(DateTime, default=datetime.utcnow)
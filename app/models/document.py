@@ -9,6 +9,13 @@ class DocumentAnalysis(Base):
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"))
     analysis = Column(String)
+    # Map-reduce analysis: "section" summaries of single chunks, "reduce"
+    # summaries of groups of them and the "final" analysis. chunk_hash
+    # identifies the input, so unchanged parts are reused.
+    kind = Column(String, nullable=True)
+    level = Column(Integer, nullable=True)
+    position = Column(Integer, nullable=True)
+    chunk_hash = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
@@ -20,3 +27,15 @@ class ChatHistory(Base):
     question = Column(String)
     answer = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ChatSummary(Base):
+    __tablename__ = "chat_summaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), unique=True)
+    summary = Column(String)
+    # Last ChatHistory id folded into the summary
+    last_chat_id = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow,
+                        onupdate=datetime.utcnow)
@@ -0,0 +1,133 @@
+# app/services/conversation_memory.py
+from datetime import datetime
+from typing import List, Tuple
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.document import ChatHistory, ChatSummary
+from app.services.llm_scheduler import estimate_tokens
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max(max_tokens, 0) * 4
+    return text if len(text) <= max_chars else text[:max_chars] + "..."
+
+
+def _upsert_summary(dialect: str, document_id: int, summary: str,
+                    last_chat_id: int):
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(ChatSummary).values(
+        document_id=document_id, summary=summary,
+        last_chat_id=last_chat_id, updated_at=datetime.utcnow())
+    return statement.on_conflict_do_update(
+        index_elements=[ChatSummary.document_id],
+        set_={
+            "summary": statement.excluded.summary,
+            "last_chat_id": statement.excluded.last_chat_id,
+            "updated_at": statement.excluded.updated_at,
+        },
+        where=ChatSummary.last_chat_id < statement.excluded.last_chat_id)
+
+
+class ConversationMemory:
+    """Bounded conversation context for a document chat.
+
+    Older turns are folded into a rolling summary stored in
+    `chat_summaries`; prompts carry that summary plus every turn not yet
+    folded into it, newest first until CHAT_HISTORY_TOKEN_BUDGET runs
+    out, so their size stays constant however long the chat grows.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _summary_row(self, document_id: int) -> ChatSummary:
+        return self.db.query(ChatSummary)\
+            .filter(ChatSummary.document_id == document_id)\
+            .first()
+
+    def _unsummarized(self, document_id: int,
+                      last_chat_id: int) -> List[ChatHistory]:
+        return self.db.query(ChatHistory)\
+            .filter(
+                ChatHistory.document_id == document_id,
+                ChatHistory.id > last_chat_id
+        )\
+            .order_by(ChatHistory.id.asc())\
+            .all()
+
+    def load(self, document_id: int) -> dict:
+        """Return the summary and recent turns to include in a prompt."""
+        row = self._summary_row(document_id)
+        summary = _truncate(row.summary, settings.CHAT_SUMMARY_MAX_TOKENS) \
+            if row and row.summary else ""
+        chats = self._unsummarized(
+            document_id, row.last_chat_id if row else 0)
+
+        budget = settings.CHAT_HISTORY_TOKEN_BUDGET - estimate_tokens(summary)
+        turns: List[Tuple[str, str]] = []
+        # Walk back from the newest turn until the budget runs out. Turns
+        # past the recent window are included too until they are folded
+        # into the summary, so none drop out of the context in between.
+        for chat in reversed(chats):
+            question = chat.question or ""
+            remaining = budget - estimate_tokens(question)
+            if remaining <= 0:
+                break
+            answer = _truncate(chat.answer or "", remaining)
+            budget = remaining - estimate_tokens(answer)
+            turns.insert(0, (question, answer))
+
+        return {"summary": summary, "turns": turns}
+
+    async def update(self, document_id: int, llm_service) -> bool:
+        """Fold turns older than the recent window into the summary.
+
+        Only runs once those turns pass CHAT_SUMMARY_THRESHOLD_TOKENS, so
+        most chats cost no extra LLM call. Returns whether it summarized.
+        """
+        row = self._summary_row(document_id)
+        chats = self._unsummarized(
+            document_id, row.last_chat_id if row else 0)
+        pending = chats[:-settings.CHAT_RECENT_TURNS] \
+            if settings.CHAT_RECENT_TURNS else chats
+        if not pending:
+            return False
+
+        size = sum(estimate_tokens(f"{chat.question} {chat.answer}")
+                   for chat in pending)
+        if size < settings.CHAT_SUMMARY_THRESHOLD_TOKENS:
+            return False
+
+        summary = await llm_service.summarize_conversation(
+            row.summary if row else "",
+            [(chat.question or "", chat.answer or "") for chat in pending]
+        )
+
+        # Concurrent updates of the same chat both get here; the one that
+        # covers more turns wins, the other leaves the row alone
+        self.db.execute(_upsert_summary(
+            self.db.get_bind().dialect.name, document_id, summary,
+            pending[-1].id))
+        self.db.commit()
+        logger.info(f"Updated chat summary for document {document_id} "
+                    f"with {len(pending)} turns")
+        return True
+
+
+async def refresh_chat_summary(document_id: int, llm_service):
+    # Runs as a background task after the response is sent, so it needs
+    # its own session.
+    db = SessionLocal()
+    try:
+        await ConversationMemory(db).update(document_id, llm_service)
+    except Exception as e:
+        logger.error(f"Chat summary update failed: {str(e)}")
+    finally:
+        db.close()
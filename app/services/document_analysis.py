@@ -0,0 +1,249 @@
+# app/services/document_analysis.py
+import asyncio
+import hashlib
+import re
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.document import ChatHistory, DocumentAnalysis
+from app.models.user import Document
+from app.services.llm_scheduler import LLMOverloaded
+from app.services.vector_store import VectorStore
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(text: str) -> str:
+    # Same digest as the vector store chunk ids
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _chunk_position(chunk_id: str) -> int:
+    # Content-hash ids have no position; the sort keeps their stored order
+    match = re.search(r"_chunk_(\d+)$", chunk_id)
+    return int(match.group(1)) if match else 0
+
+
+class DocumentAnalyzer:
+    """Map-reduce analysis over every chunk of a document.
+
+    Each chunk is summarized (map), the summaries are combined in groups
+    of ANALYSIS_REDUCE_FANOUT level by level (reduce) and the last group
+    becomes the final analysis. Every intermediate result is stored in
+    `document_analyses` keyed by a hash of its input, so re-analysis only
+    calls the LLM for chunks that changed, and the final analysis is
+    available to later questions without any call at all.
+    """
+
+    def __init__(self, db: Session, llm_service):
+        self.db = db
+        self.llm_service = llm_service
+
+    def overview(self, document_id: int) -> Optional[str]:
+        """The stored final analysis of a document, if any.
+
+        Only extra context for answers, so any failure to read it (e.g. a
+        database not migrated yet) means no overview.
+        """
+        try:
+            row = self.db.query(DocumentAnalysis)\
+                .filter(
+                    DocumentAnalysis.document_id == document_id,
+                    DocumentAnalysis.kind == "final"
+            )\
+                .order_by(DocumentAnalysis.id.desc())\
+                .first()
+        except Exception as e:
+            self.db.rollback()
+            logger.warning(
+                f"Overview of document {document_id} unavailable: {str(e)}")
+            return None
+        return row.analysis if row else None
+
+    def _stored_chunks(self, vector_store: VectorStore,
+                       document_id: str) -> List[str]:
+        # The lexical index keeps the chunk ids in document order.
+        # Documents stored before it existed only have vectors, under
+        # "{document_id}_chunk_{i}" ids that carry the order themselves.
+        index = vector_store.lexical_index.get(document_id)
+        if index is not None:
+            ids = index.ids
+        else:
+            ids = sorted(vector_store.backend.ids(document_id),
+                         key=_chunk_position)
+        texts = vector_store.backend.texts(document_id, ids)
+        return [texts[chunk_id] for chunk_id in ids if chunk_id in texts]
+
+    async def analyze(self, document: Document,
+                      chunks: List[str] = None) -> dict:
+        """Analyze the whole document, reusing stored summaries.
+
+        `chunks` defaults to the chunks in the vector store. Returns the
+        title and analysis plus how many summaries were reused or newly
+        generated.
+        """
+        if chunks is None:
+            chunks = self._stored_chunks(
+                VectorStore(), f"user_{document.user_id}_{document.id}")
+        # Repeated chunks are summarized once
+        chunks = list(dict.fromkeys(chunks))
+        if not chunks:
+            raise ValueError("Document has no stored content")
+
+        cached: Dict[Tuple[str, str], DocumentAnalysis] = {
+            (row.kind, row.chunk_hash): row
+            for row in self.db.query(DocumentAnalysis)
+            .filter(
+                DocumentAnalysis.document_id == document.id,
+                DocumentAnalysis.kind.isnot(None)
+            )
+        }
+        used = set()
+        stats = {"sections": len(chunks), "reused": 0, "generated": 0}
+        semaphore = asyncio.Semaphore(settings.ANALYSIS_CONCURRENCY)
+
+        async def summary(kind: str, level: int, position: int, key: str,
+                          make: Callable[[], Awaitable[str]]):
+            used.add((kind, key))
+            row = cached.get((kind, key))
+            if row is None:
+                text = await self._call(make, semaphore)
+                row = DocumentAnalysis(document_id=document.id, kind=kind,
+                                       chunk_hash=key, analysis=text)
+                self.db.add(row)
+                cached[(kind, key)] = row
+                stats["generated"] += 1
+            else:
+                stats["reused"] += 1
+            row.level, row.position = level, position
+            return key, row.analysis
+
+        # Map: one summary per chunk, concurrently under the cap
+        items = await asyncio.gather(*[
+            summary("section", 0, position, _digest(chunk),
+                    lambda chunk=chunk: self.llm_service.summarize_section(
+                        chunk))
+            for position, chunk in enumerate(chunks)
+        ])
+        self.db.commit()
+
+        async def reduce(level: int, position: int, group):
+            if len(group) == 1:
+                # A leftover single summary moves up as it is
+                return group[0]
+            return await summary(
+                "reduce", level, position, self._group_key(group),
+                lambda: self.llm_service.combine_summaries(
+                    [text for _, text in group]))
+
+        # Reduce level by level until one group is left
+        level = 1
+        fanout = max(settings.ANALYSIS_REDUCE_FANOUT, 2)
+        while len(items) > fanout:
+            items = await asyncio.gather(*[
+                reduce(level, position, items[i:i + fanout])
+                for position, i in enumerate(range(0, len(items), fanout))
+            ])
+            self.db.commit()
+            level += 1
+
+        fresh = ("final", self._group_key(items)) not in cached
+        _, analysis = await summary(
+            "final", level, 0, self._group_key(items),
+            lambda: self.llm_service.combine_summaries(
+                [text for _, text in items], final=True))
+
+        title = document.title
+        if fresh or title == document.filename:
+            title = await self._call(
+                lambda: self.llm_service.generate_title(analysis), semaphore)
+            document.title = title
+
+        # Drop summaries of content the document no longer has
+        for key, row in cached.items():
+            if key not in used:
+                self.db.delete(row)
+        self.db.commit()
+
+        logger.info(f"Analyzed document {document.id}: {stats}")
+        return {"title": title, "analysis": analysis, **stats}
+
+    def _group_key(self, items: List[Tuple[str, str]]) -> str:
+        return _digest(" ".join(key for key, _ in items))
+
+    async def _call(self, make: Callable[[], Awaitable[str]],
+                    semaphore: asyncio.Semaphore, attempts: int = 5):
+        # Background work: wait out provider rate limits instead of
+        # failing the whole analysis
+        for attempt in range(attempts):
+            try:
+                async with semaphore:
+                    return await make()
+            except LLMOverloaded as e:
+                if attempt == attempts - 1:
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+
+async def run_document_analysis(document_id: int, llm_service):
+    """Background map-reduce analysis after an upload.
+
+    Updates the title and the answer to the upload's "What is this
+    document about?" chat entry with the whole-document analysis.
+    """
+    db = SessionLocal()
+    try:
+        document = db.query(Document)\
+            .filter(Document.id == document_id)\
+            .first()
+        if not document:
+            return
+        result = await DocumentAnalyzer(db, llm_service).analyze(document)
+        _update_first_answer(db, document_id, result["analysis"])
+    except Exception as e:
+        logger.error(f"Analysis of document {document_id} failed: {str(e)}",
+                     exc_info=True)
+    finally:
+        db.close()
+
+
+async def run_first_chunk_analysis(document_id: int, chunks: List[str],
+                                   llm_service):
+    """Background quick analysis after a document's file was replaced.
+
+    The ANALYSIS_MODE=first_chunk counterpart of `run_document_analysis`:
+    re-titles the document and updates the first chat answer from the
+    opening chunks of the new content.
+    """
+    if not chunks:
+        return
+    db = SessionLocal()
+    try:
+        document = db.query(Document)\
+            .filter(Document.id == document_id)\
+            .first()
+        if not document:
+            return
+        result = await llm_service.analyze_document(
+            chunks, user_id=document.user_id)
+        document.title = result["title"]
+        db.commit()
+        _update_first_answer(db, document_id, result["analysis"])
+    except Exception as e:
+        logger.error(f"Analysis of document {document_id} failed: {str(e)}",
+                     exc_info=True)
+    finally:
+        db.close()
+
+
+def _update_first_answer(db: Session, document_id: int, analysis: str):
+    # The upload's "What is this document about?" entry holds the analysis
+    chat = db.query(ChatHistory)\
+        .filter(ChatHistory.document_id == document_id)\
+        .order_by(ChatHistory.id.asc())\
+        .first()
+    if chat and chat.question == "What is this document about?":
+        chat.answer = analysis
+        db.commit()
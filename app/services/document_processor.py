@@ -1,55 +1,178 @@
 # app/services/document_processor.py
+import asyncio
+import hashlib
+import multiprocessing
 import os
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Union
 import re
-import nltk
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from nltk.tokenize import word_tokenize
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from pdfminer.high_level import extract_text
-from io import BytesIO
+from app.config import settings
+from .extractors import EXTRACTORS, detect_format
 import logging
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
+_executor = None
+_worker_processor = None
+
+
+def _process_in_worker(content: bytes) -> List[str]:
+    # Runs in a pool process; each worker keeps its own processor so the
+    # NLTK resources are loaded once per process.
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+    return _worker_processor.process_document(content)
+
+
+def _is_anchor(unit: str, target_size: int) -> bool:
+    # Content-defined: each unit ends a chunk with probability
+    # len(unit) / target_size, decided by its own hash alone
+    digest = hashlib.blake2b(unit.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64 < len(unit) / target_size
+
+
+def anchored_chunks(units: Iterable[str], chunk_size: int,
+                    split: Callable[[str], List[str]]) -> Iterator[str]:
+    """Group text units (lines, paragraphs) into chunks of up to
+    `chunk_size` characters, cutting only after anchor units.
+
+    Whether a unit is an anchor depends on its content, not its position,
+    so editing one part of a document only changes the chunks around the
+    edit; the chunking re-synchronizes at the next anchor and every later
+    chunk (and its content-hash id) stays the same. Units longer than
+    `chunk_size` are cut with `split`.
+    """
+    target_size = chunk_size // 2
+    min_size = chunk_size // 8
+    current, size = [], 0
+    for unit in units:
+        if not unit:
+            continue
+        if len(unit) > chunk_size:
+            if current:
+                yield " ".join(current)
+                current, size = [], 0
+            yield from split(unit)
+            continue
+        if current and size + 1 + len(unit) > chunk_size:
+            yield " ".join(current)
+            current, size = [], 0
+        current.append(unit)
+        size += len(unit) + (1 if size else 0)
+        if size >= min_size and _is_anchor(unit, target_size):
+            yield " ".join(current)
+            current, size = [], 0
+    if current:
+        yield " ".join(current)
+
+
+def shutdown_workers():
+    """Stop the worker processes started by `process_many`, if any."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
 class DocumentProcessor:
     def __init__(self):
+        # NLTK, langchain and the PDF libraries are slow to import; keep
+        # them out of module import so the app can bind its port quickly
+        import nltk
+        from nltk.corpus import stopwords
+        from nltk.stem import WordNetLemmatizer
+        from nltk.tokenize import word_tokenize
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
         nltk.data.path.append(os.path.expanduser("~/nltk_data"))
+        self.word_tokenize = word_tokenize
         self.stopwords_set = set(stopwords.words("english"))
         self.lemmatizer = WordNetLemmatizer()
+        self.chunk_size = 4000
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=4000,
+            chunk_size=self.chunk_size,
             chunk_overlap=5
         )
+        # Format -> extractor yielding raw text pieces; see detect_format
+        self.extractors = dict(EXTRACTORS)
 
     def process_pdf(self, content: bytes) -> List[str]:
+        return self.process_document(content, "pdf")
+
+    def process_document(self, content: bytes,
+                         file_format: str = None) -> List[str]:
         try:
-            logger.debug("Starting PDF text extraction")
-            document = extract_text(BytesIO(content))
-            logger.debug("PDF text extracted successfully")       
-            logger.debug("Starting text preprocessing")
-            cleaned_text = self.preprocess_text(document)
-            logger.debug("Text preprocessing completed")
-
-            logger.debug("Creating chunks")
-            chunks = self.text_splitter.split_text(cleaned_text)
+            logger.debug("Starting document processing")
+            chunks = list(self.iter_document_chunks(content, file_format))
             logger.debug(f"Created {len(chunks)} chunks")
-
             return chunks
         except Exception as e:
-            logger.error(f"Error processing PDF: {e}")
+            logger.error(f"Error processing document: {e}")
             raise
 
+    def detect_format(self, content: bytes) -> str:
+        file_format = detect_format(content)
+        if file_format not in self.extractors:
+            raise ValueError(f"No extractor for {file_format} documents")
+        return file_format
+
+    def iter_document_chunks(self, content: bytes,
+                             file_format: str = None) -> Iterator[str]:
+        """Extract, clean and chunk a document one piece at a time.
+
+        The format is sniffed from the content unless given. Every line
+        of the extracted text is cleaned on its own, so chunks start and
+        end on line boundaries. Only the current page (or text slice) and
+        the unfinished chunk are held in memory, and chunks are yielded as
+        soon as they are complete.
+        """
+        file_format = file_format or self.detect_format(content)
+        extract = self.extractors[file_format]
+        return self.iter_chunks(
+            self.preprocess_text(line)
+            for piece in extract(content)
+            for line in piece.splitlines())
+
+    def iter_chunks(self, texts: Iterable[str]) -> Iterator[str]:
+        """Chunk a stream of preprocessed lines; see `anchored_chunks`."""
+        return anchored_chunks(
+            texts, self.chunk_size, self.text_splitter.split_text)
+
+    async def process_many(
+        self, contents: List[bytes]
+    ) -> List[Union[List[str], Exception]]:
+        """Extract and chunk several documents in parallel worker processes.
+
+        Text extraction is pure-Python and CPU bound, so threads would
+        serialize on the GIL. Failures are returned in place of the
+        chunks of the file that raised.
+        """
+        global _executor
+        if _executor is None:
+            # By now the embedding model, dispatcher and ingestion threads
+            # are running; forking would copy their locks mid-use, so the
+            # workers start as fresh interpreters
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.INGEST_WORKERS or None,
+                mp_context=multiprocessing.get_context("spawn"))
+
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(
+            *[loop.run_in_executor(_executor, _process_in_worker, content)
+              for content in contents],
+            return_exceptions=True
+        )
+
     def preprocess_text(self, text: str) -> str:
         # Convert to lowercase
         text = text.lower()
         # Remove special characters
         text = re.sub(r'[^\w\s]', "", text)
         # Tokenize
-        tokens = word_tokenize(text)
+        tokens = self.word_tokenize(text)
         # Lemmatize and remove stopwords
         tokens = [self.lemmatizer.lemmatize(token)
                   for token in tokens
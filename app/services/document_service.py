@@ -1,5 +1,8 @@
+import asyncio
 import os
-from app.models.document import DocumentAnalysis
+import uuid
+from typing import Awaitable, Callable, Tuple
+from app.models.document import ChatHistory, ChatSummary, DocumentAnalysis
 from app.models.user import Document
 from app.services.document_processor import DocumentProcessor
 from app.services.vector_store import VectorStore
@@ -26,11 +29,11 @@ class DocumentService:
         # Process content
         content = await file.read()
         processor = DocumentProcessor()
-        chunks = processor.process_pdf(content)
+        chunks = processor.process_document(content)
 
         # Store in vector database
         document_id = f"user_{user_id}_{document.id}"
-        self.vector_store.store_chunks(chunks, document_id)
+        await self.vector_store.store_chunks(chunks, document_id)
 
         return document, chunks
 
@@ -39,8 +42,12 @@ class DocumentService:
             # Ensure upload directory exists
             os.makedirs(self.upload_dir, exist_ok=True)
 
+            # Unique per upload, so same-name files never overwrite each
+            # other
             file_path = os.path.join(
-                self.upload_dir, f"{user_id}_{file.filename}")
+                self.upload_dir,
+                f"{user_id}_{uuid.uuid4().hex}_"
+                f"{os.path.basename(file.filename)}")
 
         # Save file
             try:
@@ -80,6 +87,97 @@ class DocumentService:
                 detail=f"Document save failed: {str(e)}"
             )
 
+    async def replace_document_file(
+        self, document: Document, file: UploadFile, content: bytes,
+        ingest: Callable[[], Awaitable[dict]]
+    ) -> Tuple[Document, dict]:
+        """Overwrite a document's stored file in place, keeping its id.
+
+        The new file is written next to the old one first, then `ingest`
+        brings the stored chunks up to date, and only then is the file
+        swapped in. A failed write or ingestion leaves both the file and
+        the chunks as they were. Returns the document and the ingestion
+        result.
+        """
+        tmp_path = f"{document.content_path}.tmp"
+        try:
+            with open(tmp_path, "wb") as buffer:
+                buffer.write(content)
+        except IOError as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to save file: {str(e)}"
+            )
+
+        try:
+            stats = await ingest()
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, document.content_path)
+
+        document.filename = file.filename
+        self.db.commit()
+        self.db.refresh(document)
+        return document, stats
+
+    def delete_document(self, document: Document) -> dict:
+        """Remove a document and everything derived from it.
+
+        Deletes its chats, chat summary and analyses with the row in one
+        transaction, then its vectors, lexical index and stored file.
+        Commits the session, so callers with changes they don't want
+        committed roll back first. Returns what was removed.
+        """
+        deleted, stored = self._delete_rows(document)
+        deleted["file_bytes"] = self._delete_stored(*stored)
+        return deleted
+
+    async def delete_document_async(self, document: Document) -> dict:
+        """`delete_document` for async callers.
+
+        The vector, index and file deletes block, so they run in a worker
+        thread.
+        """
+        deleted, stored = self._delete_rows(document)
+        deleted["file_bytes"] = await asyncio.to_thread(
+            self._delete_stored, *stored)
+        return deleted
+
+    def _delete_rows(self, document: Document):
+        stored = (f"user_{document.user_id}_{document.id}",
+                  document.content_path)
+        deleted = {
+            "chats": self.db.query(ChatHistory)
+            .filter(ChatHistory.document_id == document.id)
+            .delete(synchronize_session=False),
+            "chat_summaries": self.db.query(ChatSummary)
+            .filter(ChatSummary.document_id == document.id)
+            .delete(synchronize_session=False),
+            "analyses": self.db.query(DocumentAnalysis)
+            .filter(DocumentAnalysis.document_id == document.id)
+            .delete(synchronize_session=False),
+        }
+        self.db.delete(document)
+        self.db.commit()
+        return deleted, stored
+
+    def _delete_stored(self, document_id: str, content_path: str) -> int:
+        """Delete the vectors, lexical index and file; returns file bytes."""
+        try:
+            self.vector_store.backend.delete_document(document_id)
+            self.vector_store.lexical_index.delete(document_id)
+        except Exception as e:
+            # Left for scripts/compact_storage.py to clean up
+            logger.error(f"Vector cleanup failed for {document_id}: {str(e)}")
+        if content_path and os.path.exists(content_path):
+            size = os.path.getsize(content_path)
+            os.remove(content_path)
+            return size
+        return 0
+
     async def store_document_analysis(self, document_id: int, analysis: str):
         db_analysis = DocumentAnalysis(
             document_id=document_id,
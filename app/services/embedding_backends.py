@@ -0,0 +1,131 @@
+# app/services/embedding_backends.py
+import json
+import os
+import re
+from typing import List
+import numpy as np
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "all-mpnet-base-v2"
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+
+
+class SentenceTransformerBackend:
+    """The reference PyTorch backend."""
+
+    def __init__(self, model_name: str, threads: int = 0):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(
+            texts, batch_size=32, normalize_embeddings=True).tolist()
+
+
+class OnnxBackend:
+    """ONNX Runtime backend for models exported by
+    scripts/export_onnx_embeddings.py, optionally int8-quantized.
+
+    Tokenization uses the fast tokenizer directly and pooling is done in
+    numpy, so PyTorch is never imported.
+    """
+
+    def __init__(self, model_dir: str, file_name: str = "model.onnx",
+                 threads: int = 0, batch_size: int = 32):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, "embedding_config.json")) as f:
+            config = json.load(f)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = \
+            ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, file_name), options,
+            providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(
+            os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(config["max_length"])
+        # Some models (e.g. MPNet) derive position ids from the pad id, so
+        # pad with the model's own token rather than the default 0
+        self.tokenizer.enable_padding(
+            pad_id=config["pad_id"], pad_token=config["pad_token"])
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = [None] * len(texts)
+        # Batching texts of similar length keeps padding to a minimum
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            positions = order[start:start + self.batch_size]
+            encodings = self.tokenizer.encode_batch(
+                [texts[i] for i in positions])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            mask = np.array(
+                [e.attention_mask for e in encodings], dtype=np.int64)
+
+            feeds = {"input_ids": input_ids, "attention_mask": mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self.session.run(None, feeds)[0]
+
+            # Mean pooling over real tokens, then L2 normalization, as in
+            # the sentence-transformers models these are exported from
+            weights = mask[..., None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / \
+                np.clip(weights.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(
+                np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+            for position, vector in zip(positions, pooled):
+                vectors[position] = vector.tolist()
+        return vectors
+
+
+def onnx_model_dir(model_name: str = None) -> str:
+    model_name = model_name or settings.EMBEDDING_MODEL
+    if settings.EMBEDDING_ONNX_DIR and model_name == settings.EMBEDDING_MODEL:
+        return settings.EMBEDDING_ONNX_DIR
+    return os.path.join("models", f"{model_name.split('/')[-1]}-onnx")
+
+
+def load_embedding_backend(backend: str = None, model_name: str = None,
+                           threads: int = None):
+    """Build the embedding backend selected by EMBEDDING_BACKEND."""
+    backend = backend or settings.EMBEDDING_BACKEND
+    model_name = model_name or settings.EMBEDDING_MODEL
+    threads = settings.EMBEDDING_THREADS if threads is None else threads
+
+    logger.info(f"Loading {backend} embedding backend for {model_name}")
+    if backend in ONNX_FILES:
+        return OnnxBackend(onnx_model_dir(model_name),
+                           file_name=ONNX_FILES[backend], threads=threads)
+    if backend == "torch":
+        return SentenceTransformerBackend(model_name, threads=threads)
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+def collection_name(model_name: str = None) -> str:
+    """Chroma collection holding vectors of the given model.
+
+    Vectors from different models are not comparable (or even the same
+    size), so each model gets its own collection. The ONNX and quantized
+    exports of a model share it with the PyTorch original.
+    """
+    model_name = model_name or settings.EMBEDDING_MODEL
+    if model_name == DEFAULT_MODEL:
+        return "document_chunks"
+    slug = re.sub(r"[^a-zA-Z0-9_-]", "_", model_name.split("/")[-1])
+    return f"document_chunks_{slug}"[:63]
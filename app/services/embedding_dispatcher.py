@@ -0,0 +1,173 @@
+# app/services/embedding_dispatcher.py
+import asyncio
+import logging
+import threading
+import time
+from typing import List, Optional, Tuple
+from app.config import settings
+from .embedding_backends import load_embedding_backend
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingDispatcher:
+    """Collects concurrent embedding requests into batched forward passes.
+
+    Callers await `embed(texts)`; requests arriving within
+    `max_wait_ms` of each other are packed into one batch of up to
+    `max_batch` texts, embedded once, and the vectors are handed back to
+    each caller in order. Requests larger than a batch are split.
+    """
+
+    def __init__(self, max_batch: int = None, max_wait_ms: float = None):
+        self.max_batch = max_batch or settings.EMBEDDING_MAX_BATCH
+        self.max_wait = (
+            max_wait_ms if max_wait_ms is not None
+            else settings.EMBEDDING_MAX_WAIT_MS
+        ) / 1000
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Request taken off the queue that didn't fit the last batch
+        self._carry: Optional[Tuple[List[str], asyncio.Future]] = None
+        self.stats = {"requests": 0, "texts": 0, "batches": 0}
+
+    @property
+    def model(self):
+        # Warmup and the first request may both get here; load only once
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = load_embedding_backend()
+        return self._model
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # Large requests (document ingestion) go in one batch-sized slice
+        # at a time, so a query embedding arriving meanwhile waits for at
+        # most one batch instead of the whole document
+        vectors = []
+        for start in range(0, len(texts), self.max_batch):
+            self._ensure_worker()
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put(
+                (texts[start:start + self.max_batch], future))
+            vectors.extend(await future)
+        return vectors
+
+    async def embed_query(self, text: str) -> List[float]:
+        return (await self.embed([text]))[0]
+
+    def _ensure_worker(self):
+        # The queue and worker are bound to the running loop, so they are
+        # created on first use rather than at import time.
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            if self._queue is not None:
+                # Requests queued on another loop can never be served
+                self._fail(self._drain(), RuntimeError(
+                    "Embedding dispatcher moved to a new event loop"))
+            self._queue = asyncio.Queue()
+            self._loop = loop
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            if self._worker is not None and not self._worker.cancelled():
+                logger.error(f"Embedding worker died: "
+                             f"{self._worker.exception()!r}, restarting")
+            # Requests already queued are picked up by the new worker
+            self._worker = loop.create_task(self._run())
+
+    def _drain(self) -> List[Tuple[List[str], asyncio.Future]]:
+        items = [self._carry] if self._carry else []
+        self._carry = None
+        while not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        return items
+
+    @staticmethod
+    def _fail(pending: List[Tuple[List[str], asyncio.Future]],
+              error: BaseException):
+        for _, future in pending:
+            if future.done():
+                continue
+            if isinstance(error, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(error)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        pending = []
+        try:
+            while True:
+                # A request that didn't fit the previous batch goes first
+                if self._carry:
+                    pending, self._carry = [self._carry], None
+                else:
+                    pending = [await self._queue.get()]
+                size = len(pending[0][0])
+                deadline = loop.time() + self.max_wait
+
+                while size < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(
+                            self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if size + len(item[0]) > self.max_batch:
+                        self._carry = item
+                        break
+                    pending.append(item)
+                    size += len(item[0])
+
+                await self._dispatch(pending)
+                pending = []
+        except BaseException as e:
+            # Don't leave callers waiting on a batch that will never run
+            self._fail(pending, e)
+            raise
+
+    async def _dispatch(self, pending: List[Tuple[List[str], asyncio.Future]]):
+        batch = [text for texts, _ in pending for text in texts]
+        started = time.perf_counter()
+        try:
+            # The forward pass (and loading the model, if warmup has not
+            # yet) is CPU bound; run it off the event loop so new requests
+            # keep queueing up for the next batch meanwhile.
+            vectors = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: self.model.embed_documents(batch))
+        except Exception as e:
+            logger.error(f"Embedding batch failed: {str(e)}")
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats["requests"] += len(pending)
+        self.stats["texts"] += len(batch)
+        self.stats["batches"] += 1
+        logger.debug(
+            f"Embedded {len(batch)} texts from {len(pending)} requests "
+            f"in {time.perf_counter() - started:.3f}s")
+
+        offset = 0
+        for texts, future in pending:
+            if not future.done():
+                future.set_result(vectors[offset:offset + len(texts)])
+            offset += len(texts)
+
+
+_dispatcher: Optional[EmbeddingDispatcher] = None
+
+
+def get_embedding_dispatcher() -> EmbeddingDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = EmbeddingDispatcher()
+    return _dispatcher
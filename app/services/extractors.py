@@ -0,0 +1,211 @@
+# app/services/extractors.py
+"""Raw text extractors, one per document format.
+
+Every extractor takes the file bytes and yields the text in pieces
+(pages, groups of paragraphs, slices) so callers can preprocess and chunk
+while extraction is still running. `detect_format` picks the extractor
+from the content itself; file names are not trusted.
+"""
+import codecs
+import logging
+import zipfile
+from io import BytesIO
+from typing import Callable, Dict, Iterator
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Text is handed on in pieces of about this many characters
+PIECE_SIZE = 64 * 1024
+
+_WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class UnsupportedFormat(ValueError):
+    pass
+
+
+def detect_format(content: bytes) -> str:
+    """Sniff the document format: "pdf", "docx" or "txt"."""
+    head = content[:1024]
+    # The PDF header may be preceded by junk, readers look for it in the
+    # first kilobyte
+    if b"%PDF-" in head:
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        try:
+            with zipfile.ZipFile(BytesIO(content)) as archive:
+                if "word/document.xml" in archive.namelist():
+                    return "docx"
+        except zipfile.BadZipFile:
+            pass
+        raise UnsupportedFormat("Unsupported archive format")
+    sample = content[:8192]
+    if b"\x00" not in sample:
+        try:
+            # Incremental, so a character cut off at the sample end is fine
+            codecs.getincrementaldecoder("utf-8")().decode(sample)
+            return "txt"
+        except UnicodeDecodeError:
+            pass
+    raise UnsupportedFormat("Unsupported file format")
+
+
+def extract_txt(content: bytes) -> Iterator[str]:
+    """Plain text: decode and slice at line breaks, nothing else to do."""
+    text = content.decode("utf-8-sig", errors="replace")
+    start = 0
+    while start < len(text):
+        end = start + PIECE_SIZE
+        if end < len(text):
+            # Don't cut a line (or, failing that, a word) in half, so
+            # slices never change how the text is chunked
+            cut = text.rfind("\n", start, end)
+            if cut <= start:
+                cut = text.rfind(" ", start, end)
+            end = cut if cut > start else end
+        yield text[start:end]
+        start = end
+
+
+def extract_docx(content: bytes) -> Iterator[str]:
+    """Stream paragraphs out of word/document.xml.
+
+    The XML is parsed incrementally and each paragraph is cleared once its
+    text is taken, so the document tree is never held in full.
+    """
+    from xml.etree.ElementTree import iterparse
+
+    paragraph_tag = f"{_WORD_NS}p"
+    text_tag = f"{_WORD_NS}t"
+    breaks = {f"{_WORD_NS}tab": "\t", f"{_WORD_NS}br": "\n",
+              f"{_WORD_NS}cr": "\n"}
+
+    parts, size = [], 0
+    with zipfile.ZipFile(BytesIO(content)) as archive:
+        with archive.open("word/document.xml") as xml:
+            for _, element in iterparse(xml, events=("end",)):
+                if element.tag != paragraph_tag:
+                    continue
+                # Paragraphs nested in text boxes end (and are cleared)
+                # before the paragraph that holds them
+                paragraph = "".join(
+                    node.text or "" if node.tag == text_tag
+                    else breaks.get(node.tag, "")
+                    for node in element.iter())
+                element.clear()
+                if not paragraph:
+                    continue
+                parts.append(paragraph)
+                size += len(paragraph)
+                if size >= PIECE_SIZE:
+                    yield "\n".join(parts)
+                    parts, size = [], 0
+    if parts:
+        yield "\n".join(parts)
+
+
+def _pdf_pages_pdfminer(content: bytes) -> Iterator[str]:
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LTContainer, LTText
+
+    def page_text(item, parts):
+        # Same traversal as pdfminer's TextConverter (extract_text)
+        if isinstance(item, LTText):
+            parts.append(item.get_text())
+        elif isinstance(item, LTContainer):
+            for child in item:
+                page_text(child, parts)
+        return parts
+
+    for page in extract_pages(BytesIO(content)):
+        yield "".join(page_text(page, []))
+
+
+def _pdf_pages_pymupdf(content: bytes) -> Iterator[str]:
+    import fitz
+
+    with fitz.open(stream=content, filetype="pdf") as document:
+        for page in document:
+            yield page.get_text()
+
+
+def _pdf_pages_pypdfium2(content: bytes) -> Iterator[str]:
+    import pypdfium2
+
+    document = pypdfium2.PdfDocument(content)
+    try:
+        for index in range(len(document)):
+            page = document[index]
+            text_page = page.get_textpage()
+            try:
+                yield text_page.get_text_range()
+            finally:
+                text_page.close()
+                page.close()
+    finally:
+        document.close()
+
+
+# Compiled backends, fastest first; pdfminer (pure Python) is the fallback
+PDF_BACKENDS: Dict[str, Callable[[bytes], Iterator[str]]] = {
+    "pymupdf": _pdf_pages_pymupdf,
+    "pypdfium2": _pdf_pages_pypdfium2,
+    "pdfminer": _pdf_pages_pdfminer,
+}
+_PDF_MODULES = {"pymupdf": "fitz", "pypdfium2": "pypdfium2"}
+
+
+def available_pdf_backends() -> list:
+    available = []
+    for name in PDF_BACKENDS:
+        module = _PDF_MODULES.get(name)
+        if module:
+            try:
+                __import__(module)
+            except ImportError:
+                continue
+        available.append(name)
+    return available
+
+
+def pdf_backend(name: str = None) -> str:
+    """Resolve PDF_BACKEND ("auto" = fastest installed) to a backend."""
+    name = name or settings.PDF_BACKEND
+    available = available_pdf_backends()
+    if name == "auto":
+        return available[0]
+    if name not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend: {name}")
+    if name not in available:
+        logger.warning(f"PDF backend {name} is not installed, "
+                       f"using {available[0]}")
+        return available[0]
+    return name
+
+
+def extract_pdf(content: bytes, backend: str = None) -> Iterator[str]:
+    """Yield PDF pages with the configured backend.
+
+    If a compiled backend fails before producing any page (e.g. on a file
+    it cannot parse), the document is read again with pdfminer.
+    """
+    backend = pdf_backend(backend)
+    pages = 0
+    try:
+        for page in PDF_BACKENDS[backend](content):
+            pages += 1
+            yield page
+    except Exception as e:
+        if backend == "pdfminer" or pages:
+            raise
+        logger.warning(f"PDF backend {backend} failed ({e}), "
+                       f"falling back to pdfminer")
+        yield from _pdf_pages_pdfminer(content)
+
+
+EXTRACTORS: Dict[str, Callable[[bytes], Iterator[str]]] = {
+    "pdf": extract_pdf,
+    "docx": extract_docx,
+    "txt": extract_txt,
+}
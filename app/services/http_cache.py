@@ -0,0 +1,215 @@
+# app/services/http_cache.py
+import json
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from itertools import chain
+from typing import Callable, Iterable, Optional, Tuple
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, event
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.cache import ResourceVersion
+from app.models.document import ChatHistory
+from app.models.user import Document
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Version keys. The owner is part of every key, so a version row can only
+# exist for a user's own documents and a 304 needs no ownership query.
+def documents_key(user_id: int) -> str:
+    return f"documents:{user_id}"
+
+
+def document_key(user_id: int, document_id: int) -> str:
+    return f"document:{user_id}:{document_id}"
+
+
+def chat_key(user_id: int, document_id: int) -> str:
+    return f"chat:{user_id}:{document_id}"
+
+
+class ResponseCache:
+    """Serialized JSON bodies keyed by (version key, version).
+
+    A write gives the key a new version, so stale bodies are never served;
+    they are dropped after commit, or by LRU eviction.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or settings.HTTP_CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def get(self, key: str, version: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def put(self, key: str, version: str, body: bytes):
+        self._entries[key] = (version, body)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, keys: Iterable[str]):
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+_response_cache = ResponseCache()
+
+
+def get_response_cache() -> ResponseCache:
+    return _response_cache
+
+
+def _upsert(dialect: str, key: str, values: dict):
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    statement = insert(ResourceVersion).values(key=key, **values)
+    return statement.on_conflict_do_update(
+        index_elements=[ResourceVersion.key], set_=values)
+
+
+def bump_versions(db: Session, keys: Iterable[str]):
+    """Give each key a new version in the current transaction.
+
+    Called automatically when Documents or ChatHistory rows are flushed;
+    call it directly after bulk `query(...).delete()`, which skips flush.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    connection = db.connection()
+    now = datetime.utcnow()
+    for key in keys:
+        connection.execute(_upsert(
+            connection.dialect.name, key,
+            {"version": uuid.uuid4().hex, "updated_at": now}))
+    db.info.setdefault("bumped_versions", set()).update(keys)
+
+
+def forget_versions(db: Session, keys: Iterable[str]):
+    """Drop the versions of resources that no longer exist.
+
+    Without a version row the next GET builds the body (and gets its 404)
+    instead of answering a matching If-None-Match with 304.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    db.connection().execute(
+        delete(ResourceVersion).where(ResourceVersion.key.in_(keys)))
+    db.info.setdefault("bumped_versions", set()).update(keys)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_writes(session: Session, flush_context, instances):
+    keys, gone = set(), set()
+    with session.no_autoflush:
+        for obj in chain(session.new, session.dirty, session.deleted):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            if isinstance(obj, Document):
+                keys.add(documents_key(obj.user_id))
+                if obj in session.deleted:
+                    gone.update((document_key(obj.user_id, obj.id),
+                                 chat_key(obj.user_id, obj.id)))
+                elif obj.id is not None:
+                    keys.add(document_key(obj.user_id, obj.id))
+            elif isinstance(obj, ChatHistory):
+                document = session.get(Document, obj.document_id)
+                if document is not None:
+                    keys.add(chat_key(document.user_id, obj.document_id))
+    bump_versions(session, keys - gone)
+    forget_versions(session, gone)
+
+
+@event.listens_for(Session, "after_commit")
+def _drop_stale_responses(session: Session):
+    keys = session.info.pop("bumped_versions", None)
+    if keys:
+        _response_cache.invalidate(keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_bumps(session: Session):
+    session.info.pop("bumped_versions", None)
+
+
+def _current_version(db: Session, key: str) -> Tuple[ResourceVersion, bool]:
+    row = db.get(ResourceVersion, key)
+    if row is not None:
+        return row, False
+    # Never versioned yet (data from before versioning, or never read):
+    # start now, before the body is built, so a concurrent write can't
+    # slip in between reading the data and recording its version
+    bump_versions(db, [key])
+    db.commit()
+    return db.get(ResourceVersion, key), True
+
+
+def _not_modified(request: Request, etag: str, updated_at: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return etag in tags or "*" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        return updated_at.replace(microsecond=0) <= since
+    return False
+
+
+def cached_json_response(request: Request, db: Session, key: str,
+                         build: Callable[[], object]) -> Response:
+    """Serve a GET with ETag/Last-Modified validators and a body cache.
+
+    `build` runs the queries and returns the JSON-able body; it is only
+    called when neither the client nor the server cache has the current
+    version. A matching If-None-Match (or If-Modified-Since) gets a 304
+    after a single primary-key lookup of the version.
+    """
+    row, created = _current_version(db, key)
+    etag = f'"{row.version}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(
+            row.updated_at.replace(tzinfo=timezone.utc), usegmt=True),
+        # Clients may keep the body but must revalidate before using it
+        "Cache-Control": "private, no-cache",
+    }
+    if not created and _not_modified(request, etag, row.updated_at):
+        _response_cache.stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+
+    body = _response_cache.get(key, row.version)
+    if body is None:
+        try:
+            content = build()
+        except HTTPException:
+            if created:
+                # Don't keep versions for things the user can't see
+                db.delete(row)
+                db.commit()
+            raise
+        body = json.dumps(jsonable_encoder(content)).encode("utf-8")
+        _response_cache.put(key, row.version, body)
+    return Response(content=body, media_type="application/json",
+                    headers=headers)
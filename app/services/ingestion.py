@@ -0,0 +1,107 @@
+# app/services/ingestion.py
+import asyncio
+import logging
+import threading
+from typing import AsyncIterator, List, Optional
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class DocumentIngestion:
+    """Stream a document into the vector store as bounded pipeline stages.
+
+    A worker thread extracts, preprocesses and splits the document piece
+    by piece and pushes finished chunks into a bounded queue; the event loop groups
+    them into embedding batches and `VectorStore.store_chunk_stream`
+    embeds and writes them. When a later stage falls behind the queue
+    fills up and the extraction thread blocks, so memory stays flat and
+    the stages overlap instead of running one after the other.
+    """
+
+    def __init__(self, content: bytes, document_id: str, processor,
+                 vector_store, file_format: str = None,
+                 batch_size: int = None, max_pending: int = None):
+        self.content = content
+        self.file_format = file_format
+        self.document_id = document_id
+        self.processor = processor
+        self.vector_store = vector_store
+        self.batch_size = batch_size or settings.EMBEDDING_MAX_BATCH
+        self.max_pending = max_pending or settings.INGEST_QUEUE_CHUNKS
+        self._first_batch: Optional[asyncio.Future] = None
+        self._cancelled = threading.Event()
+        self.chunks = 0
+
+    async def run(self) -> dict:
+        """Ingest the whole document; returns the vector store stats."""
+        loop = asyncio.get_running_loop()
+        self._first_batch = self._first_batch or loop.create_future()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending)
+        producer = loop.run_in_executor(None, self._produce, queue, loop)
+        try:
+            stats = await self.vector_store.store_chunk_stream(
+                self._batches(queue), self.document_id)
+            await producer
+        except BaseException as e:
+            self._cancelled.set()
+            if not self._first_batch.done():
+                self._first_batch.set_exception(e)
+            # Unblock the producer if it is waiting on a full queue
+            while not queue.empty():
+                queue.get_nowait()
+            raise
+        if not self._first_batch.done():
+            self._first_batch.set_result([])
+        logger.info(f"Ingested {self.chunks} chunks into {self.document_id}")
+        return stats
+
+    async def first_chunks(self) -> List[str]:
+        """Wait for the first batch of chunks (empty if there was no text).
+
+        Lets callers start working on the beginning of the document, e.g.
+        analysis, while the rest is still being ingested.
+        """
+        if self._first_batch is None:
+            self._first_batch = asyncio.get_running_loop().create_future()
+        return await asyncio.shield(self._first_batch)
+
+    def _produce(self, queue: asyncio.Queue, loop):
+        # Runs in a worker thread; blocking on put() is the backpressure
+        try:
+            for chunk in self.processor.iter_document_chunks(
+                    self.content, self.file_format):
+                if self._cancelled.is_set():
+                    return
+                asyncio.run_coroutine_threadsafe(
+                    queue.put(chunk), loop).result()
+            item = _DONE
+        except Exception as e:
+            item = e
+        if not self._cancelled.is_set():
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    async def _batches(self, queue: asyncio.Queue) -> AsyncIterator[List[str]]:
+        # Take whatever is ready, up to one embedding batch, without
+        # waiting for a full batch
+        done = False
+        while not done:
+            batch = []
+            item = await queue.get()
+            while True:
+                if item is _DONE:
+                    done = True
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                batch.append(item)
+                if len(batch) >= self.batch_size or queue.empty():
+                    break
+                item = queue.get_nowait()
+            if batch:
+                self.chunks += len(batch)
+                if not self._first_batch.done():
+                    self._first_batch.set_result(batch)
+                yield batch
@@ -0,0 +1,171 @@
+# app/services/lexical_index.py
+import json
+import math
+import os
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+
+
+class DocumentIndex:
+    """BM25 inverted index over the chunks of a single document.
+
+    Postings are stored flattened as `[chunk, tf, chunk, tf, ...]` so the
+    serialized form stays small.
+    """
+
+    def __init__(self, ids: List[str], lengths: List[int],
+                 postings: Dict[str, List[int]]):
+        self.ids = ids
+        self.lengths = lengths
+        self.postings = postings
+        self.avg_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    @classmethod
+    def build(cls, ids: List[str], chunks: List[str]) -> "DocumentIndex":
+        index = cls([], [], {})
+        for chunk_id, chunk in zip(ids, chunks):
+            index.add(chunk_id, chunk)
+        return index
+
+    def add(self, chunk_id: str, chunk: str):
+        """Append one chunk; lets streaming ingestion index as it goes."""
+        position = len(self.ids)
+        # Chunks are already lowercased, lemmatized and stopword-free
+        # by DocumentProcessor, so whitespace splitting is enough here.
+        terms = chunk.split()
+        self.ids.append(chunk_id)
+        self.lengths.append(len(terms))
+        for term, tf in Counter(terms).items():
+            self.postings.setdefault(term, []).extend((position, tf))
+        self.avg_length += (len(terms) - self.avg_length) / len(self.ids)
+
+    def to_bytes(self) -> bytes:
+        payload = {
+            "ids": self.ids,
+            "lengths": self.lengths,
+            "postings": self.postings,
+        }
+        return zlib.compress(
+            json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DocumentIndex":
+        payload = json.loads(zlib.decompress(data).decode("utf-8"))
+        return cls(payload["ids"], payload["lengths"], payload["postings"])
+
+    def score(self, terms: List[str], k1: float = 1.5,
+              b: float = 0.75) -> Dict[str, float]:
+        n_chunks = len(self.ids)
+        scores: Dict[int, float] = {}
+        for term in set(terms):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting) // 2
+            idf = math.log(1 + (n_chunks - df + 0.5) / (df + 0.5))
+            for i in range(0, len(posting), 2):
+                position, tf = posting[i], posting[i + 1]
+                norm = k1 * (1 - b + b * self.lengths[position] /
+                             (self.avg_length or 1))
+                scores[position] = scores.get(position, 0.0) + \
+                    idf * tf * (k1 + 1) / (tf + norm)
+        return {self.ids[position]: score
+                for position, score in scores.items()}
+
+    def covers(self, terms: List[str]) -> bool:
+        return all(term in self.postings for term in terms)
+
+
+class LexicalIndex:
+    """Per-document BM25 indexes persisted next to the vector store."""
+
+    def __init__(self, path: str = None, cache_size: int = None):
+        self.path = path or settings.LEXICAL_INDEX_DIR
+        os.makedirs(self.path, exist_ok=True)
+        self.cache_size = cache_size or settings.LEXICAL_INDEX_CACHE_SIZE
+        # Most recently used indexes; the rest are read from disk again
+        self._cache: "OrderedDict[str, DocumentIndex]" = OrderedDict()
+        # Deletes also come from the retention sweeper's thread; an index
+        # read from disk is only cached if no save or delete happened
+        # meanwhile
+        self._lock = threading.Lock()
+        self._writes: Dict[str, int] = {}
+        self._processor = None
+
+    def analyze(self, text: str) -> List[str]:
+        # Queries go through the same normalization as the stored chunks.
+        if self._processor is None:
+            from .document_processor import DocumentProcessor
+            self._processor = DocumentProcessor()
+        return self._processor.preprocess_text(text).split()
+
+    def _file(self, document_id: str) -> str:
+        return os.path.join(self.path, f"{document_id}.bm25")
+
+    def build(self, document_id: str, ids: List[str], chunks: List[str]):
+        return self.save(document_id, DocumentIndex.build(ids, chunks))
+
+    def _remember(self, document_id: str, index: DocumentIndex,
+                  writes: int = None):
+        with self._lock:
+            if writes is not None and \
+                    self._writes.get(document_id, 0) != writes:
+                return
+            self._cache[document_id] = index
+            self._cache.move_to_end(document_id)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def save(self, document_id: str, index: DocumentIndex):
+        with open(self._file(document_id), "wb") as f:
+            f.write(index.to_bytes())
+        with self._lock:
+            self._writes[document_id] = self._writes.get(document_id, 0) + 1
+        self._remember(document_id, index)
+        return index
+
+    def get(self, document_id: str) -> Optional[DocumentIndex]:
+        with self._lock:
+            index = self._cache.get(document_id)
+            if index is not None:
+                self._cache.move_to_end(document_id)
+                return index
+            writes = self._writes.get(document_id, 0)
+        try:
+            with open(self._file(document_id), "rb") as f:
+                index = DocumentIndex.from_bytes(f.read())
+        except FileNotFoundError:
+            return None
+        self._remember(document_id, index, writes)
+        return index
+
+    def delete(self, document_id: str):
+        try:
+            os.remove(self._file(document_id))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._writes[document_id] = self._writes.get(document_id, 0) + 1
+            self._cache.pop(document_id, None)
+
+    def search(self, document_id: str, terms: List[str],
+               n_results: int) -> List[Tuple[str, float]]:
+        index = self.get(document_id)
+        if index is None or not terms:
+            return []
+        scores = index.score(terms)
+        return sorted(scores.items(), key=lambda item: item[1],
+                      reverse=True)[:n_results]
+
+
+_lexical_index: Optional[LexicalIndex] = None
+
+
+def get_lexical_index() -> LexicalIndex:
+    global _lexical_index
+    if _lexical_index is None:
+        _lexical_index = LexicalIndex()
+    return _lexical_index
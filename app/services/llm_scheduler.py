@@ -0,0 +1,331 @@
+# app/services/llm_scheduler.py
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Priority:
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class LLMOverloaded(Exception):
+    """Raised when an LLM call cannot be admitted; maps to HTTP 429."""
+
+    def __init__(self, retry_after: float,
+                 detail: str = "Too many requests to the language model"):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough estimate (~4 characters per token), good enough for budgeting
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens +
+                          (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def try_consume(self, tokens: float) -> float:
+        """Take `tokens` if available; otherwise return seconds to wait."""
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.refill_per_second
+
+    def refund(self, tokens: float):
+        self.tokens = min(self.capacity, self.tokens + tokens)
+
+    def charge(self, tokens: float):
+        """Take `tokens` unconditionally; the bucket may go into debt."""
+        self._refill()
+        self.tokens -= tokens
+
+
+class LLMScheduler:
+    """Admission control and priority scheduling for LLM calls.
+
+    Every call is weighted by its estimated tokens (prompt plus maximum
+    completion), capped at each budget's capacity, and must pass:
+
+    - a per-user token bucket (USER_TOKENS_PER_MINUTE),
+    - a global concurrency limit (GROQ_MAX_CONCURRENCY),
+    - a global sliding-window tokens-per-minute budget
+      (GROQ_TOKENS_PER_MINUTE).
+
+    Waiting calls are served in priority order, so interactive questions
+    overtake background analysis, and background calls may only use what
+    is left after LLM_INTERACTIVE_RESERVE of both the concurrency and the
+    token budget, so they can never starve questions. Interactive calls are rejected with
+    LLMOverloaded instead of queueing indefinitely; background calls wait.
+    When `usage` reports the tokens a call really used, both budgets are
+    settled against that instead of the estimate.
+    """
+
+    def __init__(self, max_concurrency: int = None,
+                 tokens_per_minute: int = None,
+                 user_tokens_per_minute: int = None,
+                 max_queue_depth: int = None,
+                 max_queue_wait: float = None,
+                 interactive_reserve: float = None):
+        self.max_concurrency = max_concurrency or settings.GROQ_MAX_CONCURRENCY
+        self.tokens_per_minute = tokens_per_minute or \
+            settings.GROQ_TOKENS_PER_MINUTE
+        self.user_tokens_per_minute = user_tokens_per_minute or \
+            settings.USER_TOKENS_PER_MINUTE
+        self.max_queue_depth = max_queue_depth or settings.LLM_MAX_QUEUE_DEPTH
+        self.max_queue_wait = max_queue_wait or settings.LLM_MAX_QUEUE_WAIT
+        if interactive_reserve is None:
+            interactive_reserve = settings.LLM_INTERACTIVE_RESERVE
+        # What background calls may use; always at least one call's worth
+        self.background_concurrency = max(
+            1, round(self.max_concurrency * (1 - interactive_reserve)))
+        self.background_tokens_per_minute = max(
+            1, int(self.tokens_per_minute * (1 - interactive_reserve)))
+
+        self._waiters = []  # heap of [priority, seq, future, tokens]
+        self._seq = itertools.count()
+        self._active = 0
+        self._window = deque()  # [started_at, tokens] over the last minute
+        self._window_tokens = 0
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._buckets: Dict[int, TokenBucket] = {}
+        self.stats = {"admitted": 0, "rejected": 0, "completed": 0,
+                      "failed": 0, "settled": 0}
+
+    async def run(self, call: Callable[[], Awaitable], tokens: int,
+                  user_id: int = None, priority: int = Priority.INTERACTIVE,
+                  usage: Callable[[object], Optional[int]] = None):
+        # A single call can never need more than the whole budget; an
+        # oversized one waits for a full budget and drains it
+        tokens = min(tokens, self._token_budget(priority))
+
+        bucket = None
+        user_tokens = tokens
+        if user_id is not None:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = self._buckets[user_id] = TokenBucket(
+                    self.user_tokens_per_minute,
+                    self.user_tokens_per_minute / 60)
+            user_tokens = min(tokens, bucket.capacity)
+            await self._take_from_bucket(bucket, user_tokens, priority)
+
+        try:
+            record = await self._acquire(tokens, priority)
+        except LLMOverloaded:
+            if bucket:
+                bucket.refund(user_tokens)
+            raise
+
+        self.stats["admitted"] += 1
+        try:
+            result = await call()
+            self.stats["completed"] += 1
+            actual = usage(result) if usage else None
+            if actual is not None:
+                self._settle(record, bucket, user_tokens, actual)
+            return result
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self._active -= 1
+            self._dispatch()
+
+    def pause(self, seconds: float):
+        """Hold all dispatching, e.g. after the provider answered 429."""
+        self._paused_until = max(self._paused_until,
+                                 time.monotonic() + seconds)
+        logger.warning(f"LLM dispatch paused for {seconds}s")
+
+    def _settle(self, record: list, bucket: Optional[TokenBucket],
+                user_tokens: int, actual: int):
+        """Replace the estimated charge of a finished call by its usage."""
+        self.stats["settled"] += 1
+        now = time.monotonic()
+        self._prune(now)
+        # Still inside the sliding window (older entries are gone anyway)
+        if record[0] > now - 60:
+            used = min(actual, self.tokens_per_minute)
+            self._window_tokens += used - record[1]
+            record[1] = used
+        if bucket:
+            used = min(actual, bucket.capacity)
+            if used < user_tokens:
+                bucket.refund(user_tokens - used)
+            elif used > user_tokens:
+                bucket.charge(used - user_tokens)
+
+    async def _take_from_bucket(self, bucket: TokenBucket, tokens: int,
+                                priority: int):
+        while True:
+            wait = bucket.try_consume(tokens)
+            if not wait:
+                return
+            if priority == Priority.INTERACTIVE:
+                self.stats["rejected"] += 1
+                raise LLMOverloaded(
+                    wait, "Rate limit exceeded, please retry later")
+            await asyncio.sleep(wait)
+
+    async def _acquire(self, tokens: int, priority: int):
+        if not self._waiters and self._can_start(tokens, priority):
+            return self._start(tokens)
+
+        interactive = priority == Priority.INTERACTIVE
+        if interactive and self.queue_depth(Priority.INTERACTIVE) >= \
+                self.max_queue_depth:
+            self.stats["rejected"] += 1
+            raise LLMOverloaded(
+                self._time_until_capacity(tokens, priority) or 1)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), future, tokens]
+        heapq.heappush(self._waiters, entry)
+        self._dispatch()
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(future),
+                self.max_queue_wait if interactive else None)
+        except asyncio.TimeoutError:
+            if future.done():
+                # Granted while timing out; the slot is already ours
+                return future.result()
+            self._remove(entry)
+            self.stats["rejected"] += 1
+            raise LLMOverloaded(
+                self._time_until_capacity(tokens, priority) or 1)
+        except BaseException:
+            # The caller went away: give back a granted slot or leave
+            # the queue
+            if future.done():
+                self._active -= 1
+                self._dispatch()
+            else:
+                self._remove(entry)
+            raise
+
+    def _remove(self, entry):
+        entry[2].cancel()
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+        self._dispatch()
+
+    def _prune(self, now: float):
+        while self._window and self._window[0][0] <= now - 60:
+            self._window_tokens -= self._window.popleft()[1]
+
+    def _concurrency(self, priority: int) -> int:
+        if priority == Priority.INTERACTIVE:
+            return self.max_concurrency
+        return self.background_concurrency
+
+    def _token_budget(self, priority: int) -> int:
+        if priority == Priority.INTERACTIVE:
+            return self.tokens_per_minute
+        return self.background_tokens_per_minute
+
+    def _can_start(self, tokens: int, priority: int) -> bool:
+        now = time.monotonic()
+        self._prune(now)
+        return self._active < self._concurrency(priority) and \
+            now >= self._paused_until and \
+            self._window_tokens + tokens <= self._token_budget(priority)
+
+    def _start(self, tokens: int) -> list:
+        self._active += 1
+        record = [time.monotonic(), tokens]
+        self._window.append(record)
+        self._window_tokens += tokens
+        return record
+
+    def _time_until_capacity(self, tokens: int, priority: int) -> float:
+        """Seconds until `tokens` fit the budget, ignoring concurrency."""
+        now = time.monotonic()
+        self._prune(now)
+        wait = max(0.0, self._paused_until - now)
+        excess = self._window_tokens + tokens - self._token_budget(priority)
+        for started_at, used in self._window:
+            if excess <= 0:
+                break
+            wait = max(wait, started_at + 60 - now)
+            excess -= used
+        return wait
+
+    def _dispatch(self):
+        while self._waiters:
+            priority, _, future, tokens = self._waiters[0]
+            if not self._can_start(tokens, priority):
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(self._start(tokens))
+
+        # When the head of the queue is only waiting for the clock (token
+        # window or pause), wake up once it could run. The head changes
+        # as calls queue up (a question overtakes background work with a
+        # smaller budget), so the timer is re-armed for the current one.
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._waiters and \
+                self._active < self._concurrency(self._waiters[0][0]):
+            delay = self._time_until_capacity(
+                self._waiters[0][3], self._waiters[0][0])
+            self._timer = asyncio.get_running_loop().call_later(
+                max(delay, 0.01), self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def queue_depth(self, priority: int = None) -> int:
+        return sum(1 for entry in self._waiters
+                   if priority is None or entry[0] == priority)
+
+    def metrics(self) -> dict:
+        self._prune(time.monotonic())
+        return {
+            **self.stats,
+            "active": self._active,
+            "queue_depth": {
+                "interactive": self.queue_depth(Priority.INTERACTIVE),
+                "background": self.queue_depth(Priority.BACKGROUND),
+            },
+            "tokens_last_minute": self._window_tokens,
+            "tokens_per_minute": self.tokens_per_minute,
+            "background_tokens_per_minute":
+                self.background_tokens_per_minute,
+        }
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
@@ -1,8 +1,12 @@
 # app/services/llm_service.py
-from groq import Groq
-from typing import List
+from groq import AsyncGroq, RateLimitError
+from typing import Dict, List, Tuple
+from .llm_scheduler import (
+    LLMOverloaded, Priority, estimate_tokens, get_llm_scheduler
+)
+from .single_flight import SingleFlight, normalize
 from .vector_store import VectorStore
-# from config import settings
+from app.config import settings
 import os
 from dotenv import load_dotenv
 
@@ -14,10 +18,45 @@ class LLMService:
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables")
-        self.client = Groq(api_key=api_key)
+        self.client = AsyncGroq(api_key=api_key)
         self.vector_store = VectorStore()
+        self._flights = SingleFlight("llm")
+        self.scheduler = get_llm_scheduler()
 
-    async def _analyze_content(self, chunks: List[str]) -> str:
+    async def _complete(self, messages: List[dict], user_id: int = None,
+                        priority: int = Priority.INTERACTIVE, **kwargs):
+        """Run a chat completion through the LLM scheduler."""
+        tokens = sum(estimate_tokens(message["content"])
+                     for message in messages) + \
+            kwargs.get("max_completion_tokens", 1024)
+
+        async def call():
+            try:
+                return await self.client.chat.completions.create(
+                    model="llama-3.2-3b-preview",
+                    messages=messages,
+                    **kwargs
+                )
+            except RateLimitError as e:
+                # Groq's own limit was hit: hold everyone back, not just
+                # this call
+                try:
+                    retry_after = float(e.response.headers["retry-after"])
+                except (KeyError, ValueError):
+                    retry_after = 5.0
+                self.scheduler.pause(retry_after)
+                raise LLMOverloaded(retry_after)
+
+        def usage(response):
+            # Budgets are settled against what the call really used
+            return getattr(getattr(response, "usage", None),
+                           "total_tokens", None)
+
+        return await self.scheduler.run(
+            call, tokens, user_id=user_id, priority=priority, usage=usage)
+
+    async def _analyze_content(self, chunks: List[str],
+                               user_id: int = None) -> str:
         # Analyze first chunk for initial insights
         prompt = f"""Analyze this legal document and provide:
         1. Document type and purpose
@@ -26,13 +65,14 @@ class LLMService:
 
         Content: {chunks[0]}"""
 
-        response = self.client.chat.completions.create(
-            model="llama-3.2-3b-preview",
+        response = await self._complete(
             messages=[
                 {"role": "system",
                  "content": "You are a legal document analyzer."},
                 {"role": "user", "content": prompt}
             ],
+            user_id=user_id,
+            priority=Priority.BACKGROUND,
             temperature=0.5,
             max_completion_tokens=1024,
             top_p=1
@@ -40,7 +80,8 @@ class LLMService:
 
         return response.choices[0].message.content
 
-    async def analyze_document(self, chunks: List[str]) -> dict:
+    async def analyze_document(self, chunks: List[str],
+                               user_id: int = None) -> dict:
         # First chunk for analysis
         prompt = f"""Analyze this document and provide:
 1. Document type and purpose
@@ -51,33 +92,131 @@ Content: {chunks[0]}
 
 Provide a clear analysis of the above points based on the content."""
 
-        response = self.client.chat.completions.create(
-            model="llama-3.2-3b-preview",
+        response = await self._complete(
             messages=[
                 {"role": "system",
                  "content": "You are a document analyzer. "
                  "Analyze the provided content directly."},
                 {"role": "user", "content": prompt}
             ],
+            user_id=user_id,
+            priority=Priority.BACKGROUND,
             temperature=0.7,
             max_completion_tokens=1024
         )
 
         # Generate title
-        title_response = await self.generate_title(chunks[0])
+        title_response = await self.generate_title(
+            chunks[0], user_id=user_id)
 
         return {
             "title": title_response,
             "analysis": response.choices[0].message.content
         }
 
-    async def answer_question(self, question: str, document_id: str) -> str:
+    async def summarize_section(self, chunk: str,
+                                user_id: int = None) -> str:
+        """Map step of the map-reduce analysis: summarize one chunk."""
+        prompt = f"""Summarize this section of a document.
+Keep the parties, obligations, dates, figures and defined terms it mentions.
+
+Section: {chunk}
+
+Return ONLY the summary."""
+
+        response = await self._complete(
+            messages=[
+                {"role": "system",
+                 "content": "You write brief, factual document summaries."},
+                {"role": "user", "content": prompt}
+            ],
+            user_id=user_id,
+            priority=Priority.BACKGROUND,
+            temperature=0.3,
+            max_completion_tokens=settings.ANALYSIS_SECTION_MAX_TOKENS
+        )
+
+        return response.choices[0].message.content.strip()
+
+    async def combine_summaries(self, summaries: List[str],
+                                user_id: int = None,
+                                final: bool = False) -> str:
+        """Reduce step: merge consecutive summaries into one.
+
+        With `final`, the result is the document analysis in the same
+        format `analyze_document` produces.
+        """
+        sections = "\n\n".join(
+            f"Part {i}: {summary}" for i, summary in enumerate(summaries, 1))
+        if final:
+            prompt = f"""These are summaries of consecutive parts of one document.
+Analyze the whole document and provide:
+1. Document type and purpose
+2. Key points
+3. Important terms
+
+{sections}
+
+Provide a clear analysis of the above points based on the summaries."""
+            max_tokens = 1024
+        else:
+            prompt = f"""Combine these summaries of consecutive parts of a document into one summary.
+Keep the parties, obligations, dates, figures and defined terms.
+
+{sections}
+
+Return ONLY the combined summary."""
+            max_tokens = 2 * settings.ANALYSIS_SECTION_MAX_TOKENS
+
+        response = await self._complete(
+            messages=[
+                {"role": "system",
+                 "content": "You are a document analyzer. "
+                 "Analyze the provided content directly."},
+                {"role": "user", "content": prompt}
+            ],
+            user_id=user_id,
+            priority=Priority.BACKGROUND,
+            temperature=0.5,
+            max_completion_tokens=max_tokens
+        )
+
+        return response.choices[0].message.content.strip()
+
+    async def answer_question(self, question: str, document_id: str,
+                              history: dict = None,
+                              user_id: int = None,
+                              overview: str = None) -> str:
+        """Answer a question about one document.
+
+        `history` is the conversation context from ConversationMemory
+        (`summary` and recent `turns`), letting follow-up questions refer
+        back to earlier ones. `overview` is the stored whole-document
+        analysis, if there is one. Identical concurrent questions with the
+        same history share one completion.
+        """
+        key = ("answer", document_id, normalize(question),
+               repr(history) if history else None)
+        return await self._flights.do(
+            key, lambda: self._answer_question(
+                question, document_id, history, user_id, overview))
+
+    async def _answer_question(self, question: str, document_id: str,
+                               history: dict = None,
+                               user_id: int = None,
+                               overview: str = None) -> str:
         try:
             # Debug logging
             print(f"Getting chunks for document: {document_id}")
 
-            relevant_chunks = self.vector_store.get_relevant_chunks(
-                question=question,
+            turns = history["turns"] if history else []
+            summary = history["summary"] if history else ""
+
+            # Follow-ups like "and clause 7?" only make sense next to the
+            # previous question, so retrieve with both.
+            search_query = f"{turns[-1][0]} {question}" if turns else question
+            relevant_chunks = await self.vector_store.get_relevant_chunks(
+                question=search_query,
                 document_id=document_id
             )
 
@@ -88,74 +227,226 @@ Provide a clear analysis of the above points based on the content."""
                 return (
                     "I couldn't find relevant information to answer your question.")
 
-            # Single completion instead of multiple
-            completion = self.client.chat.completions.create(
-                model="llama-3.2-3b-preview",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a helpful assistant analyzing documents. "
-                            "Provide clear and concise answers based on the given context."
-                        )
-                    },
-                    {
-                        "role": "user",
-                        "content": (
-                            f"""Using this context: """
-                            f"""{' '.join(relevant_chunks)}
+            messages = [
+                {
+                    "role": "system",
+                    "content": (
+                        "You are a helpful assistant analyzing documents. "
+                        "Provide clear and concise answers based on the given context."
+                    )
+                }
+            ]
+            if overview:
+                messages.append({
+                    "role": "system",
+                    "content": f"Overview of the whole document: {overview}"
+                })
+            if summary:
+                messages.append({
+                    "role": "system",
+                    "content": f"Summary of the earlier conversation: {summary}"
+                })
+            for previous_question, previous_answer in turns:
+                messages.append({"role": "user", "content": previous_question})
+                messages.append(
+                    {"role": "assistant", "content": previous_answer})
+            messages.append({
+                "role": "user",
+                "content": (
+                    f"""Using this context: """
+                    f"""{' '.join(relevant_chunks)}
 
 Question: {question}
 
 Provide a clear and direct answer based on the context."""
-                        )
-                    }
-                ],
+                )
+            })
+
+            # Single completion instead of multiple
+            completion = await self._complete(
+                messages=messages,
+                user_id=user_id,
                 temperature=0.7,
                 max_completion_tokens=1024
             )
 
             return completion.choices[0].message.content
+        except LLMOverloaded:
+            # Surfaced as 429 rather than saved as an answer
+            raise
         except Exception as e:
             print(f"Error in answer_question: {str(e)}")
             return f"Error processing question: {str(e)}"
 
-    async def generate_title(self, content: str) -> str:
+    async def summarize_conversation(
+        self, summary: str, turns: List[Tuple[str, str]], user_id: int = None
+    ) -> str:
+        """Fold conversation turns into the running summary."""
+        transcript = "\n".join(
+            f"User: {question}\nAssistant: {answer}"
+            for question, answer in turns
+        )
+        prompt = f"""Update the summary of a conversation about a document.
+
+Current summary: {summary or "None"}
+
+New messages:
+{transcript}
+
+Return ONLY the updated summary. Keep the facts, clauses and figures the user asked about."""
+
+        response = await self._complete(
+            messages=[
+                {"role": "system",
+                 "content": "You write brief, factual conversation summaries."},
+                {"role": "user", "content": prompt}
+            ],
+            user_id=user_id,
+            priority=Priority.BACKGROUND,
+            temperature=0.3,
+            max_completion_tokens=settings.CHAT_SUMMARY_MAX_TOKENS
+        )
+
+        return response.choices[0].message.content.strip()
+
+    async def answer_across_documents(
+        self, question: str, documents: Dict[str, str], n_results: int = 5,
+        user_id: int = None
+    ) -> dict:
+        """Answer from the best chunks of several documents in one call.
+
+        `documents` maps vector store document ids to their titles, which
+        label each excerpt so the answer can cite its sources. Excerpts
+        are kept best first within LIBRARY_CONTEXT_TOKEN_BUDGET.
+        """
+        chunks = self._fit_context(
+            await self.vector_store.get_relevant_chunks_across(
+                question=question,
+                document_ids=list(documents),
+                n_results=n_results
+            ),
+            settings.LIBRARY_CONTEXT_TOKEN_BUDGET
+        )
+
+        if not chunks:
+            return {
+                "answer": (
+                    "I couldn't find relevant information to answer your question."),
+                "sources": []
+            }
+
+        context = "\n\n".join(
+            f"[{documents[chunk['document_id']]}]\n{chunk['text']}"
+            for chunk in chunks
+        )
+
+        completion = await self._complete(
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "You are a helpful assistant analyzing a library of documents. "
+                        "Each excerpt is labeled with its document title in brackets. "
+                        "Answer from the excerpts and name the documents you rely on."
+                    )
+                },
+                {
+                    "role": "user",
+                    "content": f"""Using these excerpts:
+{context}
+
+Question: {question}
+
+Provide a clear and direct answer based on the excerpts."""
+                }
+            ],
+            user_id=user_id,
+            temperature=0.7,
+            max_completion_tokens=1024
+        )
+
+        # One entry per document, in order of its best matching chunk
+        sources = {}
+        for chunk in chunks:
+            sources.setdefault(chunk["document_id"], chunk["score"])
+
+        return {
+            "answer": completion.choices[0].message.content,
+            "sources": [
+                {"document_id": document_id, "score": score}
+                for document_id, score in sources.items()
+            ]
+        }
+
+    @staticmethod
+    def _fit_context(chunks: List[dict], budget: int) -> List[dict]:
+        # Chunks come best first; the first one is cut down rather than
+        # dropped, so there is always something to answer from
+        fitted = []
+        for chunk in chunks:
+            tokens = estimate_tokens(chunk["text"])
+            if tokens > budget:
+                if not fitted:
+                    fitted.append(
+                        {**chunk, "text": chunk["text"][:budget * 4]})
+                break
+            fitted.append(chunk)
+            budget -= tokens
+        return fitted
+
+    async def generate_title(self, content: str, user_id: int = None,
+                             priority: int = Priority.BACKGROUND) -> str:
         prompt = f"""Generate a concise title (4-6 words max) that captures the document's core purpose.
     
 Content: {content}
 
 Return ONLY the title."""
 
-        response = self.client.chat.completions.create(
-            model="llama-3.2-3b-preview",
+        response = await self._complete(
             messages=[
                 {"role": "system", "content": "Generate brief, focused document titles"},
                 {"role": "user", "content": prompt}
             ],
+            user_id=user_id,
+            priority=priority,
             temperature=0.3,  # Reduced for more focused output
             max_completion_tokens=20  # Reduced token limit
         )
 
         return response.choices[0].message.content.strip()
 
-    async def generate_quick_prompts(self, document_id: str) -> list:
-        # Get document content from vector store
-        relevant_chunks = self.vector_store.get_relevant_chunks(
-            question="What is this document about?",
-            document_id=document_id,
-            n_results=1  # Get main content
+    async def generate_quick_prompts(self, document_id: str,
+                                     user_id: int = None,
+                                     overview: str = None) -> list:
+        return await self._flights.do(
+            ("prompts", document_id),
+            lambda: self._generate_quick_prompts(
+                document_id, user_id, overview)
         )
 
+    async def _generate_quick_prompts(self, document_id: str,
+                                      user_id: int = None,
+                                      overview: str = None) -> list:
+        # The stored whole-document analysis covers more than any single
+        # chunk; fall back to the best matching chunk without one
+        if overview:
+            content = overview
+        else:
+            relevant_chunks = await self.vector_store.get_relevant_chunks(
+                question="What is this document about?",
+                document_id=document_id,
+                n_results=1  # Get main content
+            )
+            content = relevant_chunks[0]
+
         prompt = f"""Based on this document content, suggest 3 important questions that would help understand the key aspects of the document.
 
-Content: {relevant_chunks[0]}
+Content: {content}
 
 Generate 3 clear, specific questions. Each question should focus on different aspects of the document.
 Keep questions concise and directly related to the content."""
 
-        response = self.client.chat.completions.create(
-            model="llama-3.2-3b-preview",
+        response = await self._complete(
             messages=[
                 {
                     "role": "system",
@@ -163,6 +454,7 @@ Keep questions concise and directly related to the content."""
                 },
                 {"role": "user", "content": prompt}
             ],
+            user_id=user_id,
             temperature=0.4,
             max_completion_tokens=100
         )
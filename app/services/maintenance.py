@@ -0,0 +1,101 @@
+# app/services/maintenance.py
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models.document import ChatHistory, ChatSummary
+from app.models.user import Document
+from .document_service import DocumentService
+from .http_cache import bump_versions, chat_key
+
+logger = logging.getLogger(__name__)
+
+
+def retention_enabled() -> bool:
+    return bool(settings.DOCUMENT_RETENTION_DAYS or
+                settings.CHAT_RETENTION_DAYS)
+
+
+def sweep_expired(db: Session, now: datetime = None) -> dict:
+    """Apply the retention settings once; returns what was deleted."""
+    now = now or datetime.utcnow()
+    stats = {"documents": 0, "chats": 0, "chat_summaries": 0}
+
+    if settings.DOCUMENT_RETENTION_DAYS:
+        cutoff = now - timedelta(days=settings.DOCUMENT_RETENTION_DAYS)
+        # A document stays alive as long as it is being chatted with
+        last_chat = db.query(
+            ChatHistory.document_id,
+            func.max(ChatHistory.created_at).label("created_at")
+        ).group_by(ChatHistory.document_id).subquery()
+        expired = db.query(Document)\
+            .outerjoin(last_chat, last_chat.c.document_id == Document.id)\
+            .filter(
+                Document.created_at < cutoff,
+                or_(last_chat.c.created_at.is_(None),
+                    last_chat.c.created_at < cutoff)
+        )\
+            .all()
+        document_service = DocumentService(db)
+        for document in expired:
+            document_service.delete_document(document)
+            stats["documents"] += 1
+
+    if settings.CHAT_RETENTION_DAYS:
+        cutoff = now - timedelta(days=settings.CHAT_RETENTION_DAYS)
+        # Bulk deletes skip the ORM flush, so bump the chat versions here
+        affected = db.query(Document.user_id, Document.id)\
+            .join(ChatHistory, ChatHistory.document_id == Document.id)\
+            .filter(ChatHistory.created_at < cutoff)\
+            .distinct()\
+            .all()
+        # A summary built from expired turns would keep their content in
+        # prompts; the turns after them are summarized afresh
+        covers_expired = db.query(ChatHistory.id)\
+            .filter(
+                ChatHistory.document_id == ChatSummary.document_id,
+                ChatHistory.id <= ChatSummary.last_chat_id,
+                ChatHistory.created_at < cutoff
+        )\
+            .exists()
+        stats["chat_summaries"] = db.query(ChatSummary)\
+            .filter(covers_expired)\
+            .delete(synchronize_session=False)
+        stats["chats"] = db.query(ChatHistory)\
+            .filter(ChatHistory.created_at < cutoff)\
+            .delete(synchronize_session=False)
+        bump_versions(db, [chat_key(user_id, document_id)
+                           for user_id, document_id in affected])
+        db.commit()
+
+    return stats
+
+
+def _sweep():
+    db = SessionLocal()
+    try:
+        return sweep_expired(db)
+    finally:
+        db.close()
+
+
+async def retention_sweeper(after: asyncio.Task = None):
+    """Background task applying the retention policies periodically.
+
+    `after` (the startup warmup) is awaited first, so the first sweep
+    doesn't compete with the model loads.
+    """
+    if after is not None:
+        await asyncio.gather(after, return_exceptions=True)
+    interval = settings.RETENTION_SWEEP_INTERVAL_MINUTES * 60
+    while True:
+        try:
+            stats = await asyncio.to_thread(_sweep)
+            if any(stats.values()):
+                logger.info(f"Retention sweep removed {stats}")
+        except Exception as e:
+            logger.error(f"Retention sweep failed: {str(e)}", exc_info=True)
+        await asyncio.sleep(interval)
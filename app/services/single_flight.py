@@ -0,0 +1,53 @@
+# app/services/single_flight.py
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, List
+
+_groups: List["SingleFlight"] = []
+
+
+def normalize(text: str) -> str:
+    """Normalize free text so trivially different inputs share a key."""
+    return " ".join(text.lower().split())
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one in-flight computation.
+
+    The first caller for a key starts the work; callers arriving while it
+    runs await the same task and receive its result (or exception).
+    Nothing is cached once the task finishes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.stats = {"calls": 0, "executions": 0, "deduplicated": 0}
+        _groups.append(self)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        self.stats["calls"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["executions"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.stats["deduplicated"] += 1
+        # Shielded so one caller disconnecting does not cancel the work
+        # the other callers are waiting on.
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+
+def single_flight_stats() -> dict:
+    return {
+        group.name: {**group.stats, "in_flight": group.in_flight()}
+        for group in _groups
+    }
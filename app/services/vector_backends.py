@@ -0,0 +1,391 @@
+# app/services/vector_backends.py
+import json
+import os
+import shutil
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List
+import numpy as np
+from app.config import settings
+
+
+class ChromaBackend:
+    """Chunks, full float32 vectors and the HNSW index live in Chroma."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ids(self, document_id: str) -> List[str]:
+        return self.collection.get(
+            where={"document_id": document_id}, include=[])['ids']
+
+    def add(self, document_id: str, ids: List[str],
+            embeddings: List[List[float]], texts: List[str]):
+        self.collection.add(
+            embeddings=embeddings,
+            documents=texts,
+            ids=ids,
+            metadatas=[{"document_id": document_id} for _ in ids]
+        )
+
+    def delete(self, document_id: str, ids: List[str]):
+        self.collection.delete(ids=ids)
+
+    def delete_document(self, document_id: str):
+        self.collection.delete(where={"document_id": document_id})
+
+    def query(self, embedding: List[float], document_ids: List[str],
+              n_results: int) -> List[dict]:
+        where = {"document_id": document_ids[0]} if len(document_ids) == 1 \
+            else {"document_id": {"$in": document_ids}}
+        results = self.collection.query(
+            query_embeddings=[embedding],
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            {
+                "id": chunk_id,
+                "document_id": metadata["document_id"],
+                "text": text,
+                "score": 1 - distance,
+            }
+            for chunk_id, text, metadata, distance in zip(
+                results['ids'][0],
+                results['documents'][0],
+                results['metadatas'][0],
+                results['distances'][0])
+        ]
+
+    def texts(self, document_id: str, ids: List[str]) -> Dict[str, str]:
+        stored = self.collection.get(ids=ids, include=["documents"])
+        return dict(zip(stored['ids'], stored['documents']))
+
+    def vectors(self, document_id: str,
+                ids: List[str]) -> Dict[str, np.ndarray]:
+        stored = self.collection.get(ids=ids, include=["embeddings"])
+        return {chunk_id: np.asarray(vector, dtype=np.float32)
+                for chunk_id, vector in zip(stored['ids'],
+                                            stored['embeddings'])}
+
+
+def quantize(vectors: np.ndarray, dtype: str):
+    """Return (codes, scales) for unit vectors in the compact format.
+
+    int8 stores one float32 scale per vector (max |component| / 127);
+    float16 needs none.
+    """
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class _Segment:
+    """The candidate-search data of one document, held in memory."""
+
+    def __init__(self, ids: List[str], codes: np.ndarray, scales):
+        self.ids = ids
+        self.codes = codes
+        self.scales = scales
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        scores = self.codes.astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+
+class CompactBackend:
+    """Quantized per-document vector files with optional exact re-rank.
+
+    Each document gets a directory holding:
+
+    - `codes.npy` / `scales.npy`: int8 vectors with a per-vector scale (or
+      float16 vectors), searched by brute force and cached in memory,
+    - `vectors.npy`: the float32 vectors, memory-mapped only to re-rank
+      the top candidates exactly,
+    - `texts.zz`: the chunk texts as zlib-compressed JSON,
+    - `index.json`: chunk ids and the storage dtype.
+
+    Retrieval always targets one user's documents, so scanning their
+    segments is cheap and no graph index is kept.
+    """
+
+    def __init__(self, path: str, dtype: str = None, rerank: bool = None,
+                 rerank_factor: int = None, cache_size: int = 256):
+        self.path = path
+        self.dtype = dtype or settings.COMPACT_VECTOR_DTYPE
+        self.rerank = settings.COMPACT_RERANK if rerank is None else rerank
+        self.rerank_factor = rerank_factor or \
+            settings.COMPACT_RERANK_CANDIDATES
+        self.cache_size = cache_size
+        self._segments: "OrderedDict[str, _Segment]" = OrderedDict()
+        # Writes run in worker threads (see VectorStore.store_chunk_stream)
+        # while queries read. Each document has a generation, odd while
+        # its files are being swapped; reads retry until they saw one
+        # generation throughout, and only then may cache what they read.
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Read-modify-write of a document's files, one at a time
+        self._write_lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    def _dir(self, document_id: str) -> str:
+        return os.path.join(self.path, document_id)
+
+    def _consistent(self, document_id: str, read: Callable):
+        """Run `read` against a single version of a document's files.
+
+        Returns the result and the generation it belongs to.
+        """
+        while True:
+            with self._lock:
+                generation = self._generations.get(document_id, 0)
+            if generation % 2 == 0:
+                try:
+                    result = read()
+                    error = None
+                except (OSError, ValueError) as e:
+                    # Files vanished or were cut short by a concurrent
+                    # swap, unless the generation says otherwise
+                    result, error = None, e
+                with self._lock:
+                    if self._generations.get(document_id, 0) == generation:
+                        if error is not None:
+                            raise error
+                        return result, generation
+            time.sleep(0.001)
+
+    def _read_index(self, document_id: str):
+        try:
+            with open(os.path.join(self._dir(document_id),
+                                   "index.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _read(self, document_id: str):
+        def read():
+            index = self._read_index(document_id)
+            if index is None:
+                return None
+            directory = self._dir(document_id)
+            with open(os.path.join(directory, "texts.zz"), "rb") as f:
+                texts = json.loads(
+                    zlib.decompress(f.read()).decode("utf-8"))
+            vectors = np.load(os.path.join(directory, "vectors.npy"))
+            return index["ids"], vectors, texts
+        return self._consistent(document_id, read)[0]
+
+    def _read_stored(self, document_id: str, name: str):
+        """Chunk ids with their texts ("texts") or memory-mapped float32
+        vectors ("vectors"), from the same version of the document."""
+        def read():
+            index = self._read_index(document_id)
+            if index is None:
+                return None
+            if name == "texts":
+                data = self._read_texts(document_id)
+            else:
+                data = np.load(
+                    os.path.join(self._dir(document_id), "vectors.npy"),
+                    mmap_mode="r")
+            return index["ids"], data
+        return self._consistent(document_id, read)[0]
+
+    def _write(self, document_id: str, ids: List[str], vectors: np.ndarray,
+               texts: List[str]):
+        directory = self._dir(document_id)
+        tmp = f"{directory}.tmp"
+        if ids:
+            # Write into a fresh directory and swap it in, so readers never
+            # see a half-written document
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+            codes, scales = quantize(vectors, self.dtype)
+            np.save(os.path.join(tmp, "codes.npy"), codes)
+            if scales is not None:
+                np.save(os.path.join(tmp, "scales.npy"), scales)
+            np.save(os.path.join(tmp, "vectors.npy"),
+                    vectors.astype(np.float32))
+            with open(os.path.join(tmp, "texts.zz"), "wb") as f:
+                f.write(zlib.compress(json.dumps(texts).encode("utf-8")))
+            with open(os.path.join(tmp, "index.json"), "w") as f:
+                json.dump({"ids": ids, "dtype": self.dtype}, f)
+
+        with self._lock:
+            self._generations[document_id] = \
+                self._generations.get(document_id, 0) + 1
+        old = f"{directory}.old"
+        try:
+            if os.path.exists(directory):
+                os.replace(directory, old)
+            if ids:
+                os.replace(tmp, directory)
+        finally:
+            # Only now can no reader pick up the old files any more
+            with self._lock:
+                self._generations[document_id] += 1
+                self._segments.pop(document_id, None)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def _load_segment(self, document_id: str):
+        index = self._read_index(document_id)
+        if index is None:
+            return None
+        directory = self._dir(document_id)
+        codes = np.load(os.path.join(directory, "codes.npy"))
+        scales = np.load(os.path.join(directory, "scales.npy")) \
+            if index["dtype"] == "int8" else None
+        return _Segment(index["ids"], codes, scales)
+
+    def _segment(self, document_id: str):
+        with self._lock:
+            segment = self._segments.get(document_id)
+            if segment is not None:
+                self._segments.move_to_end(document_id)
+                return segment
+
+        segment, generation = self._consistent(
+            document_id, lambda: self._load_segment(document_id))
+        if segment is None:
+            return None
+        with self._lock:
+            # A write since the read would make this copy stale
+            if self._generations.get(document_id, 0) == generation:
+                self._segments[document_id] = segment
+                if len(self._segments) > self.cache_size:
+                    self._segments.popitem(last=False)
+        return segment
+
+    def ids(self, document_id: str) -> List[str]:
+        segment = self._segment(document_id)
+        return list(segment.ids) if segment else []
+
+    def add(self, document_id: str, ids: List[str],
+            embeddings: List[List[float]], texts: List[str]):
+        new = np.asarray(embeddings, dtype=np.float32)
+        new /= np.clip(np.linalg.norm(new, axis=1, keepdims=True),
+                       1e-12, None)
+        with self._write_lock:
+            stored = self._read(document_id)
+            if stored:
+                old_ids, old_vectors, old_texts = stored
+                ids = old_ids + ids
+                new = np.concatenate([old_vectors, new])
+                texts = old_texts + texts
+            self._write(document_id, ids, new, texts)
+
+    def delete(self, document_id: str, ids: List[str]):
+        with self._write_lock:
+            stored = self._read(document_id)
+            if not stored:
+                return
+            removed = set(ids)
+            old_ids, vectors, texts = stored
+            keep = [i for i, chunk_id in enumerate(old_ids)
+                    if chunk_id not in removed]
+            self._write(document_id, [old_ids[i] for i in keep],
+                        vectors[keep], [texts[i] for i in keep])
+
+    def delete_document(self, document_id: str):
+        with self._write_lock:
+            self._write(document_id, [], None, [])
+
+    def query(self, embedding: List[float], document_ids: List[str],
+              n_results: int) -> List[dict]:
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1
+
+        candidates = []
+        segment_ids = {}
+        for document_id in document_ids:
+            segment = self._segment(document_id)
+            if segment is None:
+                continue
+            segment_ids[document_id] = segment.ids
+            scores = segment.scores(query)
+            limit = min(len(scores), n_results * self.rerank_factor
+                        if self.rerank else n_results)
+            for i in np.argpartition(-scores, limit - 1)[:limit]:
+                candidates.append((float(scores[i]), document_id, int(i)))
+        candidates = [(score, document_id, segment_ids[document_id][i])
+                      for score, document_id, i in candidates]
+        candidates.sort(reverse=True)
+        if self.rerank:
+            candidates = self._rerank(
+                query, candidates[:n_results * self.rerank_factor])
+
+        # Texts are looked up by id, not row: the document may have been
+        # rewritten since its segment was scored
+        results = []
+        texts = {}
+        for score, document_id, chunk_id in candidates:
+            if document_id not in texts:
+                stored = self._read_stored(document_id, "texts")
+                texts[document_id] = dict(zip(*stored)) if stored else {}
+            if chunk_id not in texts[document_id]:
+                continue
+            results.append({
+                "id": chunk_id,
+                "document_id": document_id,
+                "text": texts[document_id][chunk_id],
+                "score": score,
+            })
+            if len(results) == n_results:
+                break
+        return results
+
+    def _rerank(self, query: np.ndarray, candidates: list) -> list:
+        # Exact scores from the memory-mapped float32 vectors; only the
+        # candidate rows are paged in
+        by_document: Dict[str, list] = {}
+        for _, document_id, chunk_id in candidates:
+            by_document.setdefault(document_id, []).append(chunk_id)
+        reranked = []
+        for document_id, chunk_ids in by_document.items():
+            stored = self._read_stored(document_id, "vectors")
+            if not stored:
+                continue
+            ids, vectors = stored
+            row_of = {chunk_id: i for i, chunk_id in enumerate(ids)}
+            found = [chunk_id for chunk_id in chunk_ids if chunk_id in row_of]
+            if not found:
+                continue
+            scores = np.asarray(
+                vectors[[row_of[chunk_id] for chunk_id in found]]) @ query
+            reranked.extend((float(score), document_id, chunk_id)
+                            for score, chunk_id in zip(scores, found))
+        reranked.sort(reverse=True)
+        return reranked
+
+    def _read_texts(self, document_id: str) -> List[str]:
+        with open(os.path.join(self._dir(document_id), "texts.zz"),
+                  "rb") as f:
+            return json.loads(zlib.decompress(f.read()).decode("utf-8"))
+
+    def texts(self, document_id: str, ids: List[str]) -> Dict[str, str]:
+        stored = self._read_stored(document_id, "texts")
+        if stored is None:
+            return {}
+        wanted = set(ids)
+        stored_ids, texts = stored
+        return {chunk_id: texts[i] for i, chunk_id in enumerate(stored_ids)
+                if chunk_id in wanted}
+
+    def vectors(self, document_id: str,
+                ids: List[str]) -> Dict[str, np.ndarray]:
+        stored = self._read_stored(document_id, "vectors")
+        if stored is None:
+            return {}
+        wanted = set(ids)
+        stored_ids, vectors = stored
+        return {chunk_id: np.asarray(vectors[i])
+                for i, chunk_id in enumerate(stored_ids)
+                if chunk_id in wanted}
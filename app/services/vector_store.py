@@ -1,75 +1,332 @@
 # app/services/vector_store.py
-from langchain.embeddings import HuggingFaceEmbeddings
-from typing import List
-import chromadb
+import asyncio
+import hashlib
+import os
+from typing import AsyncIterator, Dict, List, Tuple
+import numpy as np
+from app.config import settings
+from .embedding_backends import collection_name
+from .embedding_dispatcher import get_embedding_dispatcher
+from .lexical_index import DocumentIndex, get_lexical_index
+from .single_flight import SingleFlight, normalize
+from .vector_backends import ChromaBackend, CompactBackend
+
+_retrieval_flights = SingleFlight("retrieval")
+_compact_backend = None
+
+
+def _get_compact_backend() -> CompactBackend:
+    # One instance per process so its in-memory segment cache is shared
+    global _compact_backend
+    if _compact_backend is None:
+        _compact_backend = CompactBackend(
+            os.path.join(settings.COMPACT_VECTOR_DIR, collection_name()))
+    return _compact_backend
 
 
 class VectorStore:
     def __init__(self):
-        self.chroma_client = chromadb.PersistentClient(path="./chroma_db")
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-mpnet-base-v2")
-        self.collection = self._setup_collection()
+        # Shared across every VectorStore so concurrent requests are
+        # batched into the same forward pass.
+        self.embeddings = get_embedding_dispatcher()
+        self.lexical_index = get_lexical_index()
+        if settings.VECTOR_STORAGE == "compact":
+            self.backend = _get_compact_backend()
+        else:
+            import chromadb
+            self.chroma_client = chromadb.PersistentClient(path="./chroma_db")
+            self.collection = self._setup_collection()
+            self.backend = ChromaBackend(self.collection)
 
     def _setup_collection(self):
+        import chromadb
+        name = collection_name()
         try:
             return self.chroma_client.create_collection(
-                name="document_chunks",
+                name=name,
                 metadata={"hnsw:space": "cosine"}
             )
         except chromadb.db.base.UniqueConstraintError:
             return self.chroma_client.get_collection(
-                name="document_chunks"
+                name=name
             )
 
-    def store_chunks(self, chunks: List[str], document_id: str):
+    async def store_chunks(self, chunks: List[str], document_id: str) -> dict:
+        return (await self.store_many([(chunks, document_id)]))[0]
+
+    async def store_many(
+        self, documents: List[Tuple[List[str], str]]
+    ) -> List[dict]:
+        """Bring the stored chunks of several documents up to date.
+
+        Chunk ids are derived from the chunk content, so only chunks that
+        are new to a document are embedded and inserted, chunks that
+        disappeared are deleted and unchanged ones are left untouched.
+        New chunks of all documents share batched embedding passes.
+        Returns the added/removed/unchanged counts per document.
+        """
         try:
             # Debug logging
-            print(f"Storing chunks for document: {document_id}")
-
-        # Clear existing chunks for this document
-            try:
-                self.collection.delete(where={"document_id": document_id})
-            except Exception as e:
-                print(f"Error clearing existing chunks: {str(e)}")
-
-        # Create embeddings for each chunk
-            embeddings = [self.embeddings.embed_query(
-                chunk) for chunk in chunks]
-
-        # Store new chunks with metadata
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                self.collection.add(
-                    embeddings=[embedding],
-                    documents=[chunk],
-                    ids=[f"{document_id}_chunk_{i}"],
-                    metadatas=[{"document_id": document_id}]
-                )
-
-            print(f"Successfully stored {len(chunks)} chunks")
+            print(f"Storing chunks for {len(documents)} documents")
+
+            plans = []
+            for chunks, document_id in documents:
+                chunk_map = self._chunk_ids(chunks, document_id)
+                existing = set(self.backend.ids(document_id))
+                plans.append((
+                    document_id,
+                    chunk_map,
+                    [chunk_id for chunk_id in chunk_map
+                     if chunk_id not in existing],
+                    [chunk_id for chunk_id in existing
+                     if chunk_id not in chunk_map]
+                ))
+
+        # Create embeddings for the new chunks only, in batched passes
+            embeddings = await self.embeddings.embed([
+                chunk_map[chunk_id]
+                for _, chunk_map, added, _ in plans for chunk_id in added
+            ])
+
+            stats = []
+            offset = 0
+            for document_id, chunk_map, added, removed in plans:
+                if removed:
+                    self.backend.delete(document_id, removed)
+                if added:
+                    self.backend.add(
+                        document_id,
+                        added,
+                        embeddings[offset:offset + len(added)],
+                        [chunk_map[chunk_id] for chunk_id in added]
+                    )
+                    offset += len(added)
+                if chunk_map:
+                    self.lexical_index.build(
+                        document_id, list(chunk_map), list(chunk_map.values()))
+                else:
+                    self.lexical_index.delete(document_id)
+
+                stats.append({
+                    "added": len(added),
+                    "removed": len(removed),
+                    "unchanged": len(chunk_map) - len(added)
+                })
+                print(f"Stored chunks for document {document_id}: "
+                      f"{stats[-1]}")
+
+            return stats
         except Exception as e:
-            print(f"Error in store_chunks: {str(e)}")
+            print(f"Error in store_many: {str(e)}")
+            raise
+
+    async def store_chunk_stream(
+        self, batches: AsyncIterator[List[str]], document_id: str,
+        flush_size: int = 512
+    ) -> dict:
+        """Store a document whose chunks arrive in batches.
+
+        Same content-hash diffing as `store_many`, but new chunks are
+        embedded batch by batch and written to the backend every
+        `flush_size` chunks while later batches are still being embedded.
+        Stored chunks that never showed up are deleted at the end.
+        """
+        try:
+            print(f"Streaming chunks for document {document_id}")
+            existing = set(self.backend.ids(document_id))
+            seen = set()
+            index = DocumentIndex([], [], {})
+            pending_ids, pending_vectors, pending_texts = [], [], []
+            flushing = None
+            added = 0
+            written = []
+
+            async def flush(ids, vectors, texts):
+                written.extend(ids)
+                await asyncio.to_thread(
+                    self.backend.add, document_id, ids, vectors, texts)
+
+            async for batch in batches:
+                new_ids, new_texts = [], []
+                for chunk_id, chunk in self._chunk_ids(
+                        batch, document_id).items():
+                    if chunk_id in seen:
+                        continue
+                    seen.add(chunk_id)
+                    index.add(chunk_id, chunk)
+                    if chunk_id not in existing:
+                        new_ids.append(chunk_id)
+                        new_texts.append(chunk)
+                if not new_ids:
+                    continue
+
+                pending_vectors.extend(await self.embeddings.embed(new_texts))
+                pending_ids.extend(new_ids)
+                pending_texts.extend(new_texts)
+                added += len(new_ids)
+                if len(pending_ids) >= flush_size:
+                    # At most one write in flight; the next batches embed
+                    # while it runs
+                    if flushing:
+                        await flushing
+                    flushing = asyncio.create_task(
+                        flush(pending_ids, pending_vectors, pending_texts))
+                    pending_ids, pending_vectors, pending_texts = [], [], []
+
+            if flushing:
+                await flushing
+            if pending_ids:
+                await flush(pending_ids, pending_vectors, pending_texts)
+
+            removed = [chunk_id for chunk_id in existing
+                       if chunk_id not in seen]
+            if removed:
+                self.backend.delete(document_id, removed)
+            if seen:
+                self.lexical_index.save(document_id, index)
+            else:
+                self.lexical_index.delete(document_id)
+
+            stats = {
+                "added": added,
+                "removed": len(removed),
+                "unchanged": len(seen) - added
+            }
+            print(f"Stored chunks for document {document_id}: {stats}")
+            return stats
+        except BaseException as e:
+            print(f"Error in store_chunk_stream: {str(e)}")
+            # Leave the document as it was before this stream
+            if flushing:
+                await asyncio.gather(flushing, return_exceptions=True)
+            if written:
+                self.backend.delete(document_id, written)
             raise
 
-    def get_relevant_chunks(self, question: str, document_id: str, n_results=3):
+    def _chunk_ids(self, chunks: List[str],
+                   document_id: str) -> Dict[str, str]:
+        # Ordered id -> chunk mapping; repeated chunks are stored once.
+        chunk_map = {}
+        for chunk in chunks:
+            digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:16]
+            chunk_map.setdefault(f"{document_id}_{digest}", chunk)
+        return chunk_map
+
+    async def get_relevant_chunks(self, question: str, document_id: str,
+                                  n_results=3, mode: str = None):
+        # Identical concurrent searches (e.g. a shared document opened by
+        # several clients) run once and share the result.
+        mode = mode or settings.RETRIEVAL_MODE
+        return await _retrieval_flights.do(
+            (document_id, normalize(question), n_results, mode),
+            lambda: self._get_relevant_chunks(
+                question, document_id, n_results, mode)
+        )
+
+    async def _get_relevant_chunks(self, question: str, document_id: str,
+                                   n_results: int, mode: str):
         try:
             # Debug logging
             print(f"Searching for chunks with document_id: {document_id}")
 
-            embedding = self.embeddings.embed_query(question)
-
-            results = self.collection.query(
-                query_embeddings=[embedding],
-                n_results=n_results,
-                where={"document_id": document_id}
-            )
+            if mode != "vector":
+                index = self.lexical_index.get(document_id)
+                terms = self.lexical_index.analyze(question)
+                if index is None or not terms:
+                    # Documents ingested before the lexical index existed
+                    # only have vectors.
+                    mode = "vector"
+                elif mode == "auto":
+                    mode = "lexical" if self._is_keyword_query(
+                        index, terms) else "hybrid"
 
-        # Debug logging
-            print(f"Query results: {results}")
+            print(f"Retrieval mode: {mode}")
+            if mode == "lexical":
+                chunks = self._lexical_search(terms, document_id, n_results)
+            elif mode == "hybrid":
+                chunks = await self._hybrid_search(
+                    question, terms, document_id, n_results)
+            else:
+                chunks = await self._vector_search(
+                    question, document_id, n_results)
 
-            if not results['documents'][0]:
+            if not chunks:
                 return ["No relevant content found."]
 
-            return results['documents'][0]
+            return chunks
         except Exception as e:
             print(f"Error in get_relevant_chunks: {str(e)}")
             return ["Error retrieving relevant chunks."]
+
+    async def get_relevant_chunks_across(self, question: str,
+                                         document_ids: List[str],
+                                         n_results=5) -> List[dict]:
+        """Search several documents with one embedding and one query.
+
+        Returns the global top `n_results` chunks, each tagged with the
+        document it came from.
+        """
+        print(f"Searching {len(document_ids)} documents")
+
+        embedding = await self.embeddings.embed_query(question)
+
+        return self.backend.query(embedding, document_ids, n_results)
+
+    def _is_keyword_query(self, index, terms: List[str]) -> bool:
+        # Short clause-lookup questions whose every term occurs in the
+        # document are answered well by BM25 alone, which skips the
+        # transformer forward pass entirely.
+        return len(terms) <= settings.LEXICAL_FAST_PATH_MAX_TERMS and \
+            index.covers(terms)
+
+    async def _vector_search(self, question: str, document_id: str,
+                             n_results: int) -> List[str]:
+        embedding = await self.embeddings.embed_query(question)
+
+        results = self.backend.query(embedding, [document_id], n_results)
+
+        return [result["text"] for result in results]
+
+    def _lexical_search(self, terms: List[str], document_id: str,
+                        n_results: int) -> List[str]:
+        hits = self.lexical_index.search(document_id, terms, n_results)
+        if not hits:
+            return []
+        texts = self.backend.texts(
+            document_id, [chunk_id for chunk_id, _ in hits])
+        return [texts[chunk_id] for chunk_id, _ in hits if chunk_id in texts]
+
+    async def _hybrid_search(self, question: str, terms: List[str],
+                             document_id: str, n_results: int) -> List[str]:
+        n_candidates = max(n_results * 3, 10)
+        embedding = await self.embeddings.embed_query(question)
+
+        results = self.backend.query(embedding, [document_id], n_candidates)
+        texts = {result["id"]: result["text"] for result in results}
+        vector_scores = {result["id"]: result["score"] for result in results}
+
+        lexical_scores = dict(self.lexical_index.search(
+            document_id, terms, n_candidates))
+
+        # Lexical candidates the vector search missed still get an exact
+        # cosine score so both signals are fused on equal footing.
+        missing = [chunk_id for chunk_id in lexical_scores
+                   if chunk_id not in vector_scores]
+        if missing:
+            query = np.asarray(embedding, dtype=np.float32)
+            query /= np.linalg.norm(query) or 1
+            texts.update(self.backend.texts(document_id, missing))
+            for chunk_id, vector in self.backend.vectors(
+                    document_id, missing).items():
+                vector_scores[chunk_id] = float(
+                    query @ vector / (np.linalg.norm(vector) or 1))
+
+        top_lexical = max(lexical_scores.values(), default=0.0) or 1.0
+        weight = settings.HYBRID_VECTOR_WEIGHT
+        fused = {
+            chunk_id: weight * vector_scores[chunk_id] +
+            (1 - weight) * lexical_scores.get(chunk_id, 0.0) / top_lexical
+            for chunk_id in vector_scores
+        }
+        ranked = sorted(fused, key=fused.get, reverse=True)[:n_results]
+        return [texts[chunk_id] for chunk_id in ranked]
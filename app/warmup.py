@@ -0,0 +1,93 @@
+# app/warmup.py
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Per-component startup timings, exposed by /ready
+startup_report: Dict[str, dict] = {"warmup": {"status": "pending"}}
+
+
+def _record(name: str, status: str, started: float = None, error=None):
+    entry = {"status": status}
+    if started is not None:
+        entry["seconds"] = round(time.perf_counter() - started, 3)
+    if error is not None:
+        entry["error"] = str(error)
+    startup_report[name] = entry
+
+
+class LazyComponent:
+    """Stands in for a heavy module-level singleton until it is first used.
+
+    Attribute access builds the component (once, thread-safely) and then
+    delegates to it, so call sites read exactly as with the real object.
+    The warmup task normally builds it before the first request arrives.
+    Building blocks, so async code awaits `resolve()` first instead of
+    holding up the event loop while the component loads.
+    """
+
+    def __init__(self, name: str, factory: Callable):
+        self._name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+        startup_report.setdefault(name, {"status": "pending"})
+
+    @property
+    def ready(self) -> bool:
+        return self._instance is not None
+
+    def get(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    started = time.perf_counter()
+                    try:
+                        self._instance = self._factory()
+                    except Exception as e:
+                        _record(self._name, "failed", started, e)
+                        raise
+                    _record(self._name, "ready", started)
+                    logger.info(f"Loaded {self._name} in "
+                                f"{startup_report[self._name]['seconds']}s")
+        return self._instance
+
+    async def resolve(self):
+        """Build (or wait for the warmup task to build) in a worker thread."""
+        if self._instance is None:
+            await asyncio.to_thread(self.get)
+        return self._instance
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+
+async def warmup(steps: List[Tuple[str, Callable]]):
+    """Run blocking startup steps in a worker thread, one after another.
+
+    The server is already accepting requests while this runs; /ready
+    reports 503 until every step has finished.
+    """
+    started = time.perf_counter()
+    for name, step in steps:
+        step_started = time.perf_counter()
+        startup_report.setdefault(name, {"status": "pending"})
+        try:
+            await asyncio.to_thread(step)
+            if startup_report[name]["status"] == "pending":
+                _record(name, "ready", step_started)
+        except Exception as e:
+            logger.error(f"Warmup step {name} failed: {str(e)}",
+                         exc_info=True)
+            _record(name, "failed", step_started, e)
+    _record("warmup", "ready", started)
+    logger.info(f"Startup report: {startup_report}")
+
+
+def is_ready() -> bool:
+    return bool(startup_report) and all(
+        entry["status"] == "ready" for entry in startup_report.values())
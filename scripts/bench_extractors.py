@@ -0,0 +1,104 @@
+# scripts/bench_extractors.py
+"""Benchmark the text extractors on the same corpus.
+
+Every installed PDF backend extracts every PDF in the corpus; DOCX and
+plain-text files go through their own extractors. The report shows
+throughput and, for PDFs, how closely each backend's words match
+pdfminer's (the reference the chunks were built with so far).
+
+    python scripts/bench_extractors.py --corpus eval_corpus/ --repeat 3
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.extractors import (  # noqa: E402
+    EXTRACTORS, PDF_BACKENDS, UnsupportedFormat, available_pdf_backends,
+    detect_format
+)
+
+
+def load_corpus(path: str):
+    files = defaultdict(list)
+    for name in sorted(os.listdir(path)):
+        with open(os.path.join(path, name), "rb") as f:
+            content = f.read()
+        try:
+            files[detect_format(content)].append((name, content))
+        except UnsupportedFormat:
+            print(f"Skipping {name}: unsupported format")
+    return files
+
+
+def run(extract, files, repeat: int):
+    """Best-of-`repeat` seconds and the extracted pieces per file."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        texts = {name: list(extract(content)) for name, content in files}
+        best = min(best, time.perf_counter() - started)
+    return best, texts
+
+
+def word_overlap(a: str, b: str) -> float:
+    # Multiset overlap of words, insensitive to layout and ordering
+    a, b = Counter(a.split()), Counter(b.split())
+    total = sum((a | b).values())
+    return sum((a & b).values()) / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", required=True,
+                        help="directory of .pdf/.docx/.txt files")
+    parser.add_argument("--backend", action="append",
+                        help="PDF backends to compare (default: installed)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    files = load_corpus(args.corpus)
+    total_bytes = {kind: sum(len(content) for _, content in group)
+                   for kind, group in files.items()}
+    print(", ".join(f"{len(group)} {kind} ({total_bytes[kind] / 1e6:.1f} MB)"
+                    for kind, group in files.items()))
+
+    print(f"\n{'extractor':20} {'seconds':>8} {'MB/s':>7} {'pieces/s':>9} "
+          f"{'chars':>10} {'match':>6}")
+
+    def report(label, seconds, texts, size, match=None):
+        pieces = sum(len(parts) for parts in texts.values())
+        chars = sum(len(part) for parts in texts.values() for part in parts)
+        match = f"{match:>6.3f}" if match is not None else f"{'':>6}"
+        print(f"{label:20} {seconds:>8.3f} {size / 1e6 / seconds:>7.1f} "
+              f"{pieces / seconds:>9.1f} {chars:>10} {match}")
+
+    if files.get("pdf"):
+        backends = args.backend or available_pdf_backends()
+        reference = None
+        if "pdfminer" in backends:
+            # Reference first, so the others can be compared against it
+            backends = ["pdfminer"] + [b for b in backends if b != "pdfminer"]
+        for backend in backends:
+            seconds, texts = run(PDF_BACKENDS[backend], files["pdf"],
+                                 args.repeat)
+            joined = {name: "".join(parts) for name, parts in texts.items()}
+            if backend == "pdfminer":
+                reference = joined
+            match = sum(word_overlap(joined[name], reference[name])
+                        for name in joined) / len(joined) \
+                if reference else None
+            report(f"pdf:{backend}", seconds, texts, total_bytes["pdf"],
+                   match)
+
+    for kind in ("docx", "txt"):
+        if files.get(kind):
+            seconds, texts = run(EXTRACTORS[kind], files[kind], args.repeat)
+            report(kind, seconds, texts, total_bytes[kind])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# scripts/compact_storage.py
+"""Reclaim disk space held by deleted documents and report bytes freed.
+
+Removes everything that no longer belongs to a live document: upload
+files, lexical indexes, compact vector segments, Chroma chunks and
+orphaned chat/analysis rows. It then rebuilds the Chroma collection
+(Chroma never shrinks its index or sqlite file on delete) and VACUUMs
+the databases.
+
+Chroma is not safe to open from two processes, so stop the app first.
+
+    python scripts/compact_storage.py --dry-run
+    python scripts/compact_storage.py
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.models import (  # noqa: E402
+    ChatHistory, ChatSummary, Document, DocumentAnalysis, ResourceVersion
+)
+from app.services.embedding_backends import collection_name  # noqa: E402
+
+CHROMA_PATH = "./chroma_db"
+
+
+def size_of(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def remove(path: str, dry_run: bool) -> int:
+    size = size_of(path)
+    if not dry_run:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    return size
+
+
+def clean_database(db, dry_run: bool) -> dict:
+    live = select(Document.id)
+    removed = {}
+    for model in (ChatHistory, ChatSummary, DocumentAnalysis):
+        query = db.query(model).filter(model.document_id.notin_(live))
+        removed[model.__tablename__] = query.count() if dry_run else \
+            query.delete(synchronize_session=False)
+
+    # Version rows of deleted documents (see app/services/http_cache.py)
+    live_ids = {str(document_id) for document_id, in db.execute(live)}
+    stale = [row for row in db.query(ResourceVersion)
+             if row.key.startswith(("document:", "chat:"))
+             and row.key.rsplit(":", 1)[1] not in live_ids]
+    removed[ResourceVersion.__tablename__] = len(stale)
+    if not dry_run:
+        for row in stale:
+            db.delete(row)
+        db.commit()
+    return removed
+
+
+def clean_uploads(documents, upload_dir: str, dry_run: bool) -> int:
+    referenced = {os.path.abspath(d.content_path) for d in documents
+                  if d.content_path}
+    freed = 0
+    if os.path.isdir(upload_dir):
+        for name in os.listdir(upload_dir):
+            path = os.path.abspath(os.path.join(upload_dir, name))
+            if path not in referenced:
+                freed += remove(path, dry_run)
+    return freed
+
+
+def clean_lexical(live: set, dry_run: bool) -> int:
+    freed = 0
+    path = settings.LEXICAL_INDEX_DIR
+    if os.path.isdir(path):
+        for name in os.listdir(path):
+            if os.path.splitext(name)[0] not in live:
+                freed += remove(os.path.join(path, name), dry_run)
+    return freed
+
+
+def clean_compact(live: set, dry_run: bool) -> int:
+    # Also drops .tmp/.old directories left by an interrupted write
+    freed = 0
+    path = os.path.join(settings.COMPACT_VECTOR_DIR, collection_name())
+    if os.path.isdir(path):
+        for name in os.listdir(path):
+            if name not in live:
+                freed += remove(os.path.join(path, name), dry_run)
+    return freed
+
+
+def compact_chroma(live: set, dry_run: bool, batch_size: int = 1000) -> dict:
+    """Copy live chunks into a fresh collection and swap it in."""
+    import chromadb
+    from chromadb.db.base import UniqueConstraintError
+
+    if not os.path.isdir(CHROMA_PATH):
+        return {"chunks_kept": 0, "chunks_removed": 0}
+    client = chromadb.PersistentClient(path=CHROMA_PATH)
+    name = collection_name()
+    tmp_name = f"{name}_compacting"
+    stats = {"chunks_kept": 0, "chunks_removed": 0}
+    try:
+        old = client.get_collection(name)
+    except ValueError:
+        # A previous run stopped between dropping the old collection and
+        # renaming the new one
+        try:
+            if not dry_run:
+                client.get_collection(tmp_name).modify(name=name)
+        except ValueError:
+            pass
+        return stats
+
+    new = None
+    if not dry_run:
+        try:
+            client.delete_collection(tmp_name)
+        except ValueError:
+            pass
+        try:
+            new = client.create_collection(tmp_name, metadata=old.metadata)
+        except UniqueConstraintError:
+            new = client.get_collection(tmp_name)
+
+    for offset in range(0, old.count(), batch_size):
+        batch = old.get(limit=batch_size, offset=offset,
+                        include=["embeddings", "documents", "metadatas"])
+        keep = [i for i, metadata in enumerate(batch["metadatas"])
+                if metadata.get("document_id") in live]
+        stats["chunks_kept"] += len(keep)
+        stats["chunks_removed"] += len(batch["ids"]) - len(keep)
+        if new is not None and keep:
+            new.add(ids=[batch["ids"][i] for i in keep],
+                    embeddings=[batch["embeddings"][i] for i in keep],
+                    documents=[batch["documents"][i] for i in keep],
+                    metadatas=[batch["metadatas"][i] for i in keep])
+
+    if new is not None:
+        client.delete_collection(name)
+        new.modify(name=name)
+    return stats
+
+
+def vacuum_chroma():
+    path = os.path.join(CHROMA_PATH, "chroma.sqlite3")
+    if os.path.exists(path):
+        connection = sqlite3.connect(path)
+        try:
+            connection.execute("VACUUM")
+        finally:
+            connection.close()
+
+
+def vacuum_database():
+    with engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM"))
+
+
+def database_file():
+    url = engine.url
+    if url.get_backend_name() == "sqlite" and url.database not in (
+            None, "", ":memory:"):
+        return url.database
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true",
+                        help="report what would be removed, change nothing")
+    parser.add_argument("--upload-dir", default="uploads")
+    parser.add_argument("--skip-chroma", action="store_true",
+                        help="don't rebuild the Chroma collection")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        documents = db.query(Document).all()
+        live = {f"user_{d.user_id}_{d.id}" for d in documents}
+        print(f"{len(documents)} live documents")
+
+        db_file = database_file()
+        before = {
+            "database": size_of(db_file) if db_file else 0,
+            "chroma": size_of(CHROMA_PATH) if os.path.exists(CHROMA_PATH)
+            else 0,
+        }
+
+        rows = clean_database(db, args.dry_run)
+        freed = {
+            "uploads": clean_uploads(documents, args.upload_dir,
+                                     args.dry_run),
+            "lexical_index": clean_lexical(live, args.dry_run),
+            "compact_vectors": clean_compact(live, args.dry_run),
+        }
+    finally:
+        db.close()
+
+    chroma = {}
+    if not args.skip_chroma:
+        chroma = compact_chroma(live, args.dry_run)
+    if not args.dry_run:
+        if not args.skip_chroma:
+            vacuum_chroma()
+            freed["chroma"] = before["chroma"] - size_of(CHROMA_PATH)
+        vacuum_database()
+        if db_file:
+            freed["database"] = before["database"] - size_of(db_file)
+
+    verb = "Would remove" if args.dry_run else "Removed"
+    print(f"{verb} orphaned rows: {rows}")
+    if chroma:
+        print(f"{verb} {chroma['chunks_removed']} Chroma chunks, "
+              f"kept {chroma['chunks_kept']}")
+    print(f"\n{'storage':20} {'bytes freed':>14}")
+    for name, size in freed.items():
+        print(f"{name:20} {size:>14,}")
+    print(f"{'total':20} {sum(freed.values()):>14,}")
+    if args.dry_run:
+        print("\nChroma and database VACUUM savings are only known "
+              "after a real run.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# scripts/eval_embeddings.py
+"""Compare embedding backends for speed and retrieval quality.
+
+Every candidate embeds the same fixed corpus and query set. The report
+shows throughput (embeddings per second), recall@k of its top-k against
+the reference model's top-k, and hit@k for the chunk each query was
+sampled from.
+
+    python scripts/eval_embeddings.py --corpus eval_corpus/ \\
+        --candidate torch:all-mpnet-base-v2 --candidate onnx-int8:all-mpnet-base-v2 \\
+        --candidate torch:all-MiniLM-L6-v2 --threads 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.document_processor import DocumentProcessor  # noqa: E402
+from app.services.embedding_backends import (  # noqa: E402
+    DEFAULT_MODEL, load_embedding_backend
+)
+
+
+def load_corpus(path: str) -> List[str]:
+    processor = DocumentProcessor()
+    chunks = []
+    for name in sorted(os.listdir(path)):
+        with open(os.path.join(path, name), "rb") as f:
+            content = f.read()
+        try:
+            chunks.extend(processor.process_document(content))
+        except ValueError:
+            print(f"Skipping {name}: unsupported format")
+    return chunks
+
+
+def sample_queries(chunks: List[str], count: int,
+                   seed: int) -> List[Tuple[str, int]]:
+    """Short keyword-style queries cut from random chunks."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        source = rng.randrange(len(chunks))
+        words = chunks[source].split()[:200]
+        if len(words) < 4:
+            continue
+        length = rng.randint(4, min(12, len(words)))
+        start = rng.randrange(len(words) - length + 1)
+        queries.append((" ".join(words[start:start + length]), source))
+    return queries
+
+
+def top_k(chunk_vectors: np.ndarray, query_vectors: np.ndarray,
+          k: int) -> np.ndarray:
+    scores = query_vectors @ chunk_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def evaluate(spec: str, chunks: List[str], queries: List[str],
+             threads: int) -> dict:
+    backend, _, model_name = spec.partition(":")
+    model = load_embedding_backend(backend, model_name or DEFAULT_MODEL,
+                                   threads=threads)
+    model.embed_documents(chunks[:8])  # warm up
+
+    started = time.perf_counter()
+    chunk_vectors = np.asarray(model.embed_documents(chunks), np.float32)
+    elapsed = time.perf_counter() - started
+    query_vectors = np.asarray(model.embed_documents(queries), np.float32)
+
+    return {
+        "spec": spec,
+        "per_second": len(chunks) / elapsed,
+        "dimension": chunk_vectors.shape[1],
+        "chunk_vectors": chunk_vectors,
+        "query_vectors": query_vectors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", required=True,
+                        help="directory of .pdf/.docx/.txt files")
+    parser.add_argument("--candidate", action="append", required=True,
+                        help="backend:model, e.g. onnx-int8:all-mpnet-base-v2")
+    parser.add_argument("--reference", default=f"torch:{DEFAULT_MODEL}")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    chunks = load_corpus(args.corpus)
+    queries = sample_queries(chunks, args.queries, args.seed)
+    texts = [query for query, _ in queries]
+    sources = np.array([source for _, source in queries])
+    print(f"Corpus: {len(chunks)} chunks, {len(queries)} queries, "
+          f"k={args.k}")
+
+    reference = evaluate(args.reference, chunks, texts, args.threads)
+    expected = top_k(reference["chunk_vectors"],
+                     reference["query_vectors"], args.k)
+
+    print(f"{'backend:model':45} {'dim':>5} {'emb/s':>8} "
+          f"{'recall@k':>9} {'hit@k':>6}")
+    for result in [reference] + [
+            evaluate(spec, chunks, texts, args.threads)
+            for spec in args.candidate if spec != args.reference]:
+        found = top_k(result["chunk_vectors"],
+                      result["query_vectors"], args.k)
+        recall = np.mean([len(set(a) & set(b)) / args.k
+                          for a, b in zip(found, expected)])
+        hits = np.mean([source in row for source, row in zip(sources, found)])
+        print(f"{result['spec']:45} {result['dimension']:>5} "
+              f"{result['per_second']:>8.1f} {recall:>9.3f} {hits:>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
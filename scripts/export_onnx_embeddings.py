@@ -0,0 +1,78 @@
+# scripts/export_onnx_embeddings.py
+"""Export a sentence-transformers model for the ONNX embedding backends.
+
+Writes model.onnx, an int8 dynamically quantized model_int8.onnx, the
+fast tokenizer and the pooling settings into one directory, which is what
+`EMBEDDING_BACKEND=onnx` / `onnx-int8` load.
+
+    python scripts/export_onnx_embeddings.py --model all-MiniLM-L6-v2
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def export(model_name: str, out_dir: str, quantize: bool = True):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(out_dir, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    transformer.config.return_dict = False
+    tokenizer = model.tokenizer
+    tokenizer.save_pretrained(out_dir)
+
+    sample = tokenizer(["An example sentence to trace the model."],
+                       return_tensors="pt")
+    input_names = ["input_ids", "attention_mask"]
+    if "token_type_ids" in sample:
+        input_names.append("token_type_ids")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"}
+                    for name in input_names + ["last_hidden_state"]}
+
+    model_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            do_constant_folding=True
+        )
+    print(f"Exported {model_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantized_path = os.path.join(out_dir, "model_int8.onnx")
+        quantize_dynamic(model_path, quantized_path,
+                         weight_type=QuantType.QInt8)
+        print(f"Quantized {quantized_path}")
+
+    with open(os.path.join(out_dir, "embedding_config.json"), "w") as f:
+        json.dump({
+            "model_name": model_name,
+            "max_length": model.max_seq_length,
+            "pad_id": tokenizer.pad_token_id,
+            "pad_token": tokenizer.pad_token,
+            "dimension": model.get_sentence_embedding_dimension()
+        }, f, indent=2)
+
+
+if __name__ == "__main__":
+    from app.services.embedding_backends import DEFAULT_MODEL, onnx_model_dir
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--out", help="defaults to models/<model>-onnx")
+    parser.add_argument("--no-quantize", action="store_true")
+    args = parser.parse_args()
+
+    export(args.model, args.out or onnx_model_dir(args.model),
+           quantize=not args.no_quantize)
@@ -0,0 +1,124 @@
+# scripts/vector_storage_report.py
+"""Report bytes per chunk and recall of the compact vector storage modes.
+
+Reads every chunk of the current Chroma collection, rebuilds it in a
+temporary directory in each compact mode (int8 and float16, with and
+without exact re-rank) and compares them with exact float32 search.
+
+    python scripts/vector_storage_report.py --queries 500 --k 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.embedding_backends import collection_name  # noqa: E402
+from app.services.vector_backends import CompactBackend  # noqa: E402
+
+
+def directory_size(path: str, names=None) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            if names is None or name in names:
+                total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def load_chroma(path: str, batch_size: int = 1000):
+    import chromadb
+    collection = chromadb.PersistentClient(path=path).get_collection(
+        collection_name())
+    ids, vectors, texts, documents = [], [], [], []
+    for offset in range(0, collection.count(), batch_size):
+        batch = collection.get(
+            limit=batch_size, offset=offset,
+            include=["embeddings", "documents", "metadatas"])
+        ids.extend(batch["ids"])
+        vectors.extend(batch["embeddings"])
+        texts.extend(batch["documents"])
+        documents.extend(m["document_id"] for m in batch["metadatas"])
+    return ids, np.asarray(vectors, dtype=np.float32), texts, documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chroma", default="./chroma_db")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.05,
+                        help="query = stored vector + gaussian noise")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    ids, vectors, texts, documents = load_chroma(args.chroma)
+    if not ids:
+        sys.exit("The collection is empty")
+    vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True),
+                       1e-12, None)
+    count, dimension = vectors.shape
+    print(f"{count} chunks, {len(set(documents))} documents, "
+          f"{dimension} dimensions")
+
+    chroma_bytes = directory_size(args.chroma)
+    text_bytes = sum(len(text.encode("utf-8")) for text in texts)
+    print(f"\n{'storage':28} {'disk B/chunk':>13} {'search B/chunk':>15}")
+    print(f"{'chroma (float32 + HNSW)':28} {chroma_bytes / count:>13.0f} "
+          f"{4 * dimension:>15}")
+    print(f"  of which chunk text: {text_bytes / count:.0f} B/chunk")
+
+    # Queries near stored chunks, searched over every document at once
+    rng = np.random.default_rng(args.seed)
+    rows = rng.choice(count, size=min(args.queries, count), replace=False)
+    queries = vectors[rows] + rng.normal(
+        scale=args.noise / np.sqrt(dimension),
+        size=(len(rows), dimension)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+    expected = [{ids[i] for i in row} for row in exact]
+
+    by_document = defaultdict(list)
+    for i, document_id in enumerate(documents):
+        by_document[document_id].append(i)
+    document_ids = list(by_document)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in ("int8", "float16"):
+            path = os.path.join(tmp, dtype)
+            store = CompactBackend(path, dtype=dtype)
+            for document_id, members in by_document.items():
+                store.add(document_id, [ids[i] for i in members],
+                          vectors[members].tolist(),
+                          [texts[i] for i in members])
+            search_bytes = directory_size(path, {"codes.npy", "scales.npy"})
+            disk_bytes = directory_size(path)
+
+            for rerank in (False, True):
+                store.rerank = rerank
+                recall = np.mean([
+                    len({r["id"] for r in store.query(
+                        query.tolist(), document_ids, args.k)} & truth)
+                    / args.k
+                    for query, truth in zip(queries, expected)
+                ])
+                label = f"compact {dtype}" + (" + re-rank" if rerank else "")
+                results.append((label, disk_bytes / count,
+                                search_bytes / count, recall))
+
+    for label, disk, search, _ in results:
+        print(f"{label:28} {disk:>13.0f} {search:>15.0f}")
+
+    print(f"\n{'storage':28} {f'recall@{args.k}':>10}")
+    print(f"{'exact float32 (reference)':28} {'1.000':>10}")
+    for label, _, _, recall in results:
+        print(f"{label:28} {recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+
+# app.config requires these; tests never reach Groq or a real database
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("JWT_SECRET", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
@@ -0,0 +1,37 @@
+from app.services.document_analysis import DocumentAnalyzer
+
+
+class NoLexicalIndex:
+    def get(self, document_id):
+        return None
+
+
+class LegacyBackend:
+    """Chunks stored before the lexical index, as "{id}_chunk_{i}"."""
+
+    def __init__(self, document_id, chunks):
+        self.stored = {f"{document_id}_chunk_{i}": chunk
+                       for i, chunk in enumerate(chunks)}
+
+    def ids(self, document_id):
+        # Vector stores return ids in no particular order
+        return sorted(self.stored, reverse=True)
+
+    def texts(self, document_id, ids):
+        return {chunk_id: self.stored[chunk_id] for chunk_id in ids}
+
+
+class FakeVectorStore:
+    def __init__(self, backend):
+        self.lexical_index = NoLexicalIndex()
+        self.backend = backend
+
+
+def test_chunks_without_lexical_index_come_from_the_vector_store():
+    chunks = [f"part {i}" for i in range(12)]
+    vector_store = FakeVectorStore(LegacyBackend("user_1_2", chunks))
+
+    stored = DocumentAnalyzer(None, None)._stored_chunks(
+        vector_store, "user_1_2")
+
+    assert stored == chunks
@@ -0,0 +1,48 @@
+import random
+
+from app.services.document_processor import anchored_chunks
+
+CHUNK_SIZE = 4000
+
+
+def split(text):
+    return [text[i:i + CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE)]
+
+
+def make_document(seed=7, paragraphs=400):
+    rng = random.Random(seed)
+    words = [f"term{i}" for i in range(500)]
+    return [" ".join(rng.choices(words, k=rng.randint(5, 60)))
+            for _ in range(paragraphs)]
+
+
+def chunk(lines):
+    return list(anchored_chunks(lines, CHUNK_SIZE, split))
+
+
+def test_chunks_respect_the_size_limit():
+    chunks = chunk(make_document())
+    assert len(chunks) > 10
+    assert all(len(text) <= CHUNK_SIZE for text in chunks)
+    # Nothing is lost or reordered
+    assert " ".join(chunks) == " ".join(make_document())
+
+
+def test_editing_one_paragraph_changes_few_chunks():
+    for position in (3, 150, 398):
+        original = make_document()
+        edited = list(original)
+        edited[position] = "inserted " + edited[position]
+
+        before, after = chunk(original), chunk(edited)
+        # Only these would be embedded again; everything else keeps its
+        # content hash
+        changed = set(after) - set(before)
+        assert 1 <= len(changed) <= 2
+        assert len(set(before) - set(after)) <= 2
+
+
+def test_long_units_are_split():
+    chunks = chunk(["x" * (CHUNK_SIZE * 2 + 10), "short line"])
+    assert chunks == ["x" * CHUNK_SIZE, "x" * CHUNK_SIZE, "x" * 10,
+                      "short line"]
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.services.embedding_dispatcher import EmbeddingDispatcher
+
+
+class FakeModel:
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+def make_dispatcher(max_batch=4):
+    dispatcher = EmbeddingDispatcher(max_batch=max_batch, max_wait_ms=1)
+    dispatcher._model = FakeModel()
+    return dispatcher
+
+
+def test_large_request_is_split_into_batches():
+    dispatcher = make_dispatcher()
+    texts = ["x" * i for i in range(10)]
+
+    vectors = asyncio.run(dispatcher.embed(texts))
+
+    assert vectors == [[float(i)] for i in range(10)]
+    assert [len(batch) for batch in dispatcher._model.batches] == [4, 4, 2]
+
+
+def test_query_waits_for_at_most_one_batch():
+    dispatcher = make_dispatcher()
+
+    async def scenario():
+        ingest = asyncio.ensure_future(dispatcher.embed(["doc"] * 12))
+        await asyncio.sleep(0)
+        await dispatcher.embed_query("query")
+        await ingest
+
+    asyncio.run(scenario())
+    position = next(i for i, batch in enumerate(dispatcher._model.batches)
+                    if "query" in batch)
+    assert position <= 1
+    assert all(len(batch) <= 4 for batch in dispatcher._model.batches)
+
+
+def test_queued_requests_survive_a_dead_worker():
+    dispatcher = make_dispatcher()
+
+    async def scenario():
+        await dispatcher.embed(["warm"])
+        dispatcher._worker.cancel()
+        await asyncio.sleep(0)
+        # Queued while no worker was running
+        waiting = asyncio.get_running_loop().create_future()
+        await dispatcher._queue.put((["queued"], waiting))
+        after = await dispatcher.embed(["after"])
+        return await waiting, after
+
+    assert asyncio.run(scenario()) == ([[6.0]], [[5.0]])
+
+
+def test_crashed_worker_fails_its_batch():
+    dispatcher = make_dispatcher()
+
+    async def crash(pending):
+        raise RuntimeError("boom")
+
+    dispatcher._dispatch = crash
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(dispatcher.embed(["lost"]))
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_scheduler import LLMOverloaded, LLMScheduler, Priority
+
+
+def make_scheduler(**kwargs):
+    options = dict(max_concurrency=4, tokens_per_minute=10000,
+                   user_tokens_per_minute=1000, max_queue_depth=10,
+                   max_queue_wait=1.0)
+    options.update(kwargs)
+    return LLMScheduler(**options)
+
+
+async def respond():
+    return "answer"
+
+
+def test_call_larger_than_user_capacity_is_admitted():
+    scheduler = make_scheduler()
+
+    async def scenario():
+        # Estimated at 4x what the user may spend in a minute
+        return await scheduler.run(respond, 4000, user_id=1)
+
+    assert asyncio.run(scenario()) == "answer"
+    # It drained the bucket rather than overdrawing it
+    assert scheduler._buckets[1].tokens < 1
+
+
+def test_drained_bucket_rejects_next_interactive_call():
+    scheduler = make_scheduler()
+
+    async def scenario():
+        await scheduler.run(respond, 4000, user_id=1)
+        await scheduler.run(respond, 4000, user_id=1)
+
+    with pytest.raises(LLMOverloaded) as error:
+        asyncio.run(scenario())
+    # A full bucket refills within a minute
+    assert error.value.retry_after <= 60
+
+
+def test_usage_settles_the_estimate():
+    scheduler = make_scheduler()
+
+    async def scenario():
+        # Both calls fit once the first is charged what it really used
+        await scheduler.run(respond, 4000, user_id=1, usage=lambda _: 200)
+        return await scheduler.run(respond, 500, user_id=1)
+
+    assert asyncio.run(scenario()) == "answer"
+    assert scheduler.metrics()["tokens_last_minute"] == 700
+    assert scheduler.stats["settled"] == 1
+
+
+def test_usage_above_estimate_is_charged():
+    scheduler = make_scheduler()
+
+    async def scenario():
+        await scheduler.run(respond, 100, user_id=1, usage=lambda _: 900)
+        await scheduler.run(respond, 500, user_id=1)
+
+    with pytest.raises(LLMOverloaded):
+        asyncio.run(scenario())
+
+
+def test_background_calls_leave_the_reserve_to_questions():
+    scheduler = make_scheduler(tokens_per_minute=1000,
+                               interactive_reserve=0.3)
+
+    async def scenario():
+        await scheduler.run(respond, 700, priority=Priority.BACKGROUND)
+        # The background share is used up for this minute...
+        background = asyncio.ensure_future(
+            scheduler.run(respond, 100, priority=Priority.BACKGROUND))
+        await asyncio.sleep(0.05)
+        assert not background.done()
+        # ...but the reserve still admits a question at once
+        answer = await scheduler.run(respond, 300)
+        background.cancel()
+        return answer
+
+    assert asyncio.run(scenario()) == "answer"
+    assert scheduler.queue_depth() == 0
+
+
+def test_question_behind_waiting_background_call_is_not_delayed():
+    scheduler = make_scheduler(tokens_per_minute=1000,
+                               interactive_reserve=0.3, max_queue_wait=1.0)
+
+    async def scenario():
+        await scheduler.run(respond, 650, priority=Priority.BACKGROUND)
+        scheduler.pause(0.2)
+        # Needs the background share to free up, about a minute away
+        background = asyncio.ensure_future(
+            scheduler.run(respond, 100, priority=Priority.BACKGROUND))
+        await asyncio.sleep(0)
+        # Only held by the pause, so admitted as soon as it ends
+        started = asyncio.get_running_loop().time()
+        answer = await scheduler.run(respond, 100)
+        waited = asyncio.get_running_loop().time() - started
+        background.cancel()
+        return answer, waited
+
+    answer, waited = asyncio.run(scenario())
+    assert answer == "answer"
+    assert waited < 0.5
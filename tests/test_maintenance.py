@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.models import Base, ChatHistory, ChatSummary, Document
+from app.services.conversation_memory import ConversationMemory
+from app.services.maintenance import sweep_expired
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_purged_chat_no_longer_contributes_a_summary(db, monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_RETENTION_DAYS", 30)
+    monkeypatch.setattr(settings, "DOCUMENT_RETENTION_DAYS", 0)
+    now = datetime.utcnow()
+    document = Document(user_id=1, filename="a.pdf", title="A")
+    db.add(document)
+    db.commit()
+    old = ChatHistory(document_id=document.id, question="old question",
+                      answer="old answer",
+                      created_at=now - timedelta(days=60))
+    recent = ChatHistory(document_id=document.id, question="new question",
+                         answer="new answer", created_at=now)
+    db.add_all([old, recent])
+    db.commit()
+    db.add(ChatSummary(document_id=document.id,
+                       summary="The user asked the old question",
+                       last_chat_id=old.id))
+    db.commit()
+
+    stats = sweep_expired(db, now=now)
+
+    assert stats["chats"] == 1
+    assert stats["chat_summaries"] == 1
+    history = ConversationMemory(db).load(document.id)
+    assert history["summary"] == ""
+    assert history["turns"] == [("new question", "new answer")]
+
+
+def test_summary_of_live_turns_is_kept(db, monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_RETENTION_DAYS", 30)
+    monkeypatch.setattr(settings, "DOCUMENT_RETENTION_DAYS", 0)
+    now = datetime.utcnow()
+    document = Document(user_id=1, filename="a.pdf", title="A")
+    db.add(document)
+    db.commit()
+    chat = ChatHistory(document_id=document.id, question="q", answer="a",
+                       created_at=now)
+    db.add(chat)
+    db.commit()
+    db.add(ChatSummary(document_id=document.id, summary="Recent summary",
+                       last_chat_id=chat.id))
+    db.commit()
+
+    assert sweep_expired(db, now=now)["chat_summaries"] == 0
+    assert ConversationMemory(db).load(document.id)["summary"] == \
+        "Recent summary"
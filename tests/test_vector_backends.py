@@ -0,0 +1,88 @@
+import sys
+import threading
+
+import numpy as np
+
+from app.services import vector_backends
+from app.services.vector_backends import CompactBackend
+
+
+def batch(start, size, dimensions=8):
+    ids = [f"chunk{i}" for i in range(start, start + size)]
+    rng = np.random.default_rng(start)
+    vectors = rng.normal(size=(size, dimensions)).tolist()
+    return ids, vectors, [f"text of {chunk_id}" for chunk_id in ids]
+
+
+def test_read_during_write_keeps_no_stale_segment(tmp_path, monkeypatch):
+    backend = CompactBackend(str(tmp_path), dtype="int8")
+    backend.add("doc", *batch(0, 10))
+    quantize = vector_backends.quantize
+
+    def quantize_and_read(vectors, dtype):
+        # A query arriving while the new files are being written
+        assert len(backend.ids("doc")) == 10
+        return quantize(vectors, dtype)
+
+    monkeypatch.setattr(vector_backends, "quantize", quantize_and_read)
+    backend.add("doc", *batch(10, 10))
+
+    assert len(backend.ids("doc")) == 20
+    assert backend.texts("doc", ["chunk15"]) == {"chunk15": "text of chunk15"}
+
+
+def test_concurrent_reads_and_writes(tmp_path):
+    backend = CompactBackend(str(tmp_path), dtype="int8", rerank=True,
+                             rerank_factor=2, cache_size=1)
+    backend.add("doc", *batch(0, 100))
+    backend.add("other", *batch(0, 10))
+    done = threading.Event()
+    errors = []
+
+    def read():
+        query = np.ones(8).tolist()
+        reads = 0
+        while not done.is_set():
+            try:
+                # Two documents through a one-entry cache keep evicting
+                ids = backend.ids("doc") + backend.ids("other")
+                reads += 1
+                if reads % 10:
+                    continue
+                texts = backend.texts("doc", ids[-5:])
+                assert all(text == f"text of {chunk_id}"
+                           for chunk_id, text in texts.items())
+                for result in backend.query(query, ["doc"], 3):
+                    assert result["text"] == f"text of {result['id']}"
+            except Exception as e:
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    # Switch threads often so reads land in the middle of writes
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        for reader in readers:
+            reader.start()
+        for start in range(100, 2000, 100):
+            backend.add("doc", *batch(start, 100))
+    finally:
+        done.set()
+        for reader in readers:
+            reader.join()
+        sys.setswitchinterval(interval)
+
+    assert not errors
+    assert len(backend.ids("doc")) == 2000
+
+
+def test_deleted_document_is_gone_from_the_cache(tmp_path):
+    backend = CompactBackend(str(tmp_path), dtype="float16")
+    backend.add("doc", *batch(0, 10))
+    assert len(backend.ids("doc")) == 10
+
+    backend.delete_document("doc")
+
+    assert backend.ids("doc") == []
+    assert backend.texts("doc", ["chunk1"]) == {}